@@ -4,20 +4,58 @@ Web interface for the PDF Intelligence System
 Provides a user-friendly web interface for PDF processing
 """
 
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Request, render_template, request, jsonify, send_file, Response
 import os
 import json
+import shutil
+import threading
 import time
+import uuid
 from pathlib import Path
 from werkzeug.utils import secure_filename
-from src.structure_extractor import StructureExtractor
-from src.persona_analyzer import PersonaAnalyzer
+from src.document_parser import DocumentParser
+from src.embedding_cache import EmbeddingCache
+from src.document_cache import DocumentCache
+from src.job_queue import JobStore, JobQueue, QueueFullError
+from src import model_registry, instrumentation
+from src.embedding_backends import create_backend
+from src.embedding_scheduler import EmbeddingScheduler
+from src.profiling import ProfileSession
+from src.uploads import UploadBuffer, UploadedPDF
 from src.utils import setup_logging
 
+class SpoolingRequest(Request):
+    """Parses multipart file parts straight into UploadBuffers, which keep them in memory up
+    to UPLOAD_SPILL_BYTES (instead of werkzeug's 500KB) and hash them on the way"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadBuffer(secure_filename(filename or ''), app.config['UPLOAD_SPILL_BYTES'],
+                            Path(app.config['UPLOAD_FOLDER']))
+
 app = Flask(__name__)
+app.request_class = SpoolingRequest
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# /upload keeps PDFs up to this size in memory; larger ones go to a unique file in UPLOAD_FOLDER
+app.config['UPLOAD_SPILL_BYTES'] = int(os.environ.get('UPLOAD_SPILL_BYTES', 4 * 1024 * 1024))
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'output'
+app.config['CACHE_FOLDER'] = 'cache'
+app.config['JOB_CONCURRENCY'] = int(os.environ.get('JOB_CONCURRENCY', 2))
+app.config['JOB_QUEUE_DEPTH'] = int(os.environ.get('JOB_QUEUE_DEPTH', 16))
+app.config['WARMUP_MODEL'] = os.environ.get('WARMUP_MODEL', '0') == '1'
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
+# Requests to /upload carrying this header set to 1 are profiled into output/profiles/<id>/
+app.config['PROFILE_HEADER'] = 'X-Profile'
+app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED', '1') == '1'
+# Persona requests and jobs share one inference thread that batches their texts together
+app.config['EMBED_MAX_BATCH'] = int(os.environ.get('EMBED_MAX_BATCH', 64))
+app.config['EMBED_MAX_WAIT_MS'] = float(os.environ.get('EMBED_MAX_WAIT_MS', 5))
+app.config['EMBED_INTRA_OP_THREADS'] = int(os.environ.get('EMBED_INTRA_OP_THREADS', 0))
+app.config['EMBEDDING'] = {
+    'backend': os.environ.get('EMBEDDING_BACKEND', 'torch'),
+    'model_path': os.environ.get('EMBEDDING_MODEL_PATH', ''),
+    'quantized': os.environ.get('EMBEDDING_QUANTIZED', '0') == '1'
+}
 
 # Ensure directories exist
 Path(app.config['UPLOAD_FOLDER']).mkdir(exist_ok=True)
@@ -25,12 +63,143 @@ Path(app.config['OUTPUT_FOLDER']).mkdir(exist_ok=True)
 
 # Setup logging
 setup_logging()
+instrumentation.enable(app.config['METRICS_ENABLED'])
+
+# Section embeddings and parsed documents are shared across requests and survive restarts
+embedding_cache = EmbeddingCache(Path(app.config['CACHE_FOLDER']) / 'embeddings.db')
+document_cache = DocumentCache(Path(app.config['CACHE_FOLDER']) / 'documents')
+
+# Background jobs run on a bounded in-process pool; state lives in a local SQLite file
+job_store = JobStore(Path(app.config['CACHE_FOLDER']) / 'jobs.db')
+job_queue = JobQueue(job_store, app.config['JOB_CONCURRENCY'], app.config['JOB_QUEUE_DEPTH'])
+
+_embedding_scheduler = None
+_embedding_scheduler_lock = threading.Lock()
+
+def embedding_backend():
+    """The shared embedding scheduler, created with its model on first use"""
+    global _embedding_scheduler
+    with _embedding_scheduler_lock:
+        if _embedding_scheduler is None:
+            _embedding_scheduler = EmbeddingScheduler(
+                create_backend(app.config['EMBEDDING']),
+                max_batch_size=app.config['EMBED_MAX_BATCH'],
+                max_wait=app.config['EMBED_MAX_WAIT_MS'] / 1000,
+                intra_op_threads=app.config['EMBED_INTRA_OP_THREADS']
+            )
+        return _embedding_scheduler
+
+# The embedding model is loaded once per process, either here or on the first persona request
+if app.config['WARMUP_MODEL']:
+    embedding_backend().encode("warm up")
 
 @app.route('/')
 def index():
     """Main page"""
     return render_template('index.html')
 
+def process_uploaded_files(uploaded_files, processing_mode, persona='', job_description='', progress=None,
+                           run_id=None, profiled=False):
+    """Run structure extraction or persona analysis over saved uploads and write the outputs.
+
+    With a run_id (e.g. a job id) the output file names carry it, so concurrent runs never
+    overwrite each other's results. A profiled run embeds on the calling thread instead of
+    through the shared scheduler, so its profile includes the model's CPU time.
+    """
+    suffix = f"_{run_id}" if run_id else ''
+    results = []
+    if processing_mode == 'structure':
+        # Round 1A: Structure extraction
+        parser = DocumentParser()
+        stems = [pdf_file.stem for pdf_file in uploaded_files]
+        for parsed, pdf_file in enumerate(uploaded_files, start=1):
+            start_time = time.time()
+            digest = document_cache.fingerprint(pdf_file)
+            cached = document_cache.get(digest)
+            if cached:
+                result = cached["structure"]
+            else:
+                # Parsed with its sections, so a later persona request finds it in the cache too
+                document = parser.parse(pdf_file)
+                if document:
+                    result = document[0]
+                    document_cache.put(digest, *document)
+                else:
+                    # Reports why the PDF could not be loaded
+                    result = parser.extractor.extract_structure(pdf_file)
+            elapsed = time.time() - start_time
+            if progress:
+                progress('documents_parsed', parsed)
+            
+            # Save result; uploads sharing a name are told apart by their position
+            stem = pdf_file.stem if stems.count(pdf_file.stem) == 1 else f"{pdf_file.stem}_{parsed}"
+            output_file = Path(app.config['OUTPUT_FOLDER']) / f"{stem}_structure{suffix}.json"
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+            
+            results.append({
+                'filename': pdf_file.name,
+                'processing_time': f"{elapsed:.2f}s",
+                'output_file': output_file.name,
+                'title': result.get('title', 'Unknown'),
+                'sections': len(result.get('outline', []))
+            })
+    
+    elif processing_mode == 'persona':
+        # Round 1B: Persona-driven analysis (imported lazily, it pulls in torch)
+        from src.persona_analyzer import PersonaAnalyzer
+        # The scheduler encodes on its own inference thread, which the profiler does not see
+        backend = embedding_backend().backend if profiled else embedding_backend()
+        analyzer = PersonaAnalyzer(embedding_cache=embedding_cache, document_cache=document_cache,
+                                   backend=backend)
+        config = {
+            'persona': persona,
+            'job_to_be_done': job_description
+        }
+        
+        start_time = time.time()
+        result = analyzer.analyze_documents(uploaded_files, config, progress=progress)
+        elapsed = time.time() - start_time
+        
+        # Save result
+        output_file = Path(app.config['OUTPUT_FOLDER']) / f"persona_analysis{suffix}.json"
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        
+        results.append({
+            'processing_time': f"{elapsed:.2f}s",
+            'output_file': output_file.name,
+            'documents_processed': len(uploaded_files),
+            'relevant_sections': len(result.get('extracted_sections', []))
+        })
+    
+    return results
+
+def save_uploads(files, target_dir):
+    """Save the PDF uploads into target_dir and return their paths.
+
+    Each upload gets a numbered subdirectory, so parts with the same file name do not
+    overwrite each other and still keep their own name.
+    """
+    uploaded_files = []
+    for position, upload in enumerate(read_uploads(files), start=1):
+        filepath = Path(target_dir) / str(position) / upload.name
+        filepath.parent.mkdir()
+        upload.save(filepath)
+        uploaded_files.append(filepath)
+    return uploaded_files
+
+def uploaded_pdf(file):
+    """The content of an uploaded file part, taken over from the buffer it was parsed into"""
+    if isinstance(file.stream, UploadBuffer):
+        return file.stream.finish()
+    return UploadedPDF.from_stream(secure_filename(file.filename), file.stream,
+                                   app.config['UPLOAD_SPILL_BYTES'], Path(app.config['UPLOAD_FOLDER']))
+
+def read_uploads(files):
+    """The PDF uploads, in memory (large ones spilled to disk) without saving them by name"""
+    return [uploaded_pdf(file) for file in files if file and file.filename.endswith('.pdf')]
+
 @app.route('/upload', methods=['POST'])
 def upload_files():
     """Handle file upload and processing"""
@@ -46,81 +215,132 @@ def upload_files():
         if not files or all(f.filename == '' for f in files):
             return jsonify({'error': 'No files selected'}), 400
         
-        # Save uploaded files
-        uploaded_files = []
-        for file in files:
-            if file and file.filename.endswith('.pdf'):
-                filename = secure_filename(file.filename)
-                filepath = Path(app.config['UPLOAD_FOLDER']) / filename
-                file.save(filepath)
-                uploaded_files.append(filepath)
+        if processing_mode == 'persona' and (not persona or not job_description):
+            return jsonify({'error': 'Persona and job description required for persona analysis'}), 400
+        
+        # Uploads are parsed straight from memory; nothing is written under their own names
+        uploaded_files = read_uploads(files)
         
         if not uploaded_files:
             return jsonify({'error': 'No valid PDF files uploaded'}), 400
         
-        # Process files
-        results = []
-        if processing_mode == 'structure':
-            # Round 1A: Structure extraction
-            extractor = StructureExtractor()
-            for pdf_file in uploaded_files:
-                start_time = time.time()
-                result = extractor.extract_structure(pdf_file)
-                elapsed = time.time() - start_time
-                
-                # Save result
-                output_file = Path(app.config['OUTPUT_FOLDER']) / f"{pdf_file.stem}_structure.json"
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(result, f, indent=2, ensure_ascii=False)
-                
-                results.append({
-                    'filename': pdf_file.name,
-                    'processing_time': f"{elapsed:.2f}s",
-                    'output_file': output_file.name,
-                    'title': result.get('title', 'Unknown'),
-                    'sections': len(result.get('outline', []))
-                })
-        
-        elif processing_mode == 'persona':
-            # Round 1B: Persona-driven analysis
-            if not persona or not job_description:
-                return jsonify({'error': 'Persona and job description required for persona analysis'}), 400
-            
-            analyzer = PersonaAnalyzer()
-            config = {
-                'persona': persona,
-                'job_to_be_done': job_description
-            }
-            
-            start_time = time.time()
-            result = analyzer.analyze_documents(uploaded_files, config)
-            elapsed = time.time() - start_time
-            
-            # Save result
-            output_file = Path(app.config['OUTPUT_FOLDER']) / "persona_analysis.json"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(result, f, indent=2, ensure_ascii=False)
-            
-            results.append({
-                'processing_time': f"{elapsed:.2f}s",
-                'output_file': output_file.name,
-                'documents_processed': len(uploaded_files),
-                'relevant_sections': len(result.get('extracted_sections', []))
-            })
+        session = None
+        if app.config['PROFILING_ENABLED'] and request.headers.get(app.config['PROFILE_HEADER']) == '1':
+            profile_dir = Path(app.config['OUTPUT_FOLDER']) / 'profiles' / uuid.uuid4().hex
+            session = ProfileSession.try_start(profile_dir)
         
-        # Clean up uploaded files
-        for file_path in uploaded_files:
-            file_path.unlink()
+        # Process files
+        try:
+            # Named per request, so concurrent uploads never overwrite each other's results
+            results = process_uploaded_files(uploaded_files, processing_mode, persona, job_description,
+                                             run_id=uuid.uuid4().hex, profiled=session is not None)
+        finally:
+            profile_files = session.stop() if session else []
+            # Release the buffers and delete any spill files
+            for upload in uploaded_files:
+                upload.close()
         
-        return jsonify({
+        response = {
             'success': True,
             'results': results,
             'processing_mode': processing_mode
-        })
+        }
+        if session:
+            response['profile'] = {
+                'directory': str(session.output_dir),
+                'files': [p.name for p in profile_files]
+            }
+        elif request.headers.get(app.config['PROFILE_HEADER']) == '1':
+            response['profile'] = {'error': 'Profiling is disabled or another request is being profiled'}
+        return jsonify(response)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue uploaded files for background processing and return the job id immediately"""
+    try:
+        if 'files[]' not in request.files:
+            return jsonify({'error': 'No files selected'}), 400
+        
+        files = request.files.getlist('files[]')
+        processing_mode = request.form.get('mode', 'structure')
+        persona = request.form.get('persona', '')
+        job_description = request.form.get('job_description', '')
+        
+        if not files or all(f.filename == '' for f in files):
+            return jsonify({'error': 'No files selected'}), 400
+        
+        if processing_mode == 'persona' and (not persona or not job_description):
+            return jsonify({'error': 'Persona and job description required for persona analysis'}), 400
+        
+        # Each job keeps its uploads in its own directory until it has run
+        job_dir = Path(app.config['UPLOAD_FOLDER']) / uuid.uuid4().hex
+        job_dir.mkdir(parents=True)
+        uploaded_files = save_uploads(files, job_dir)
+        
+        if not uploaded_files:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            return jsonify({'error': 'No valid PDF files uploaded'}), 400
+        
+        def run(progress, job_id):
+            results = process_uploaded_files(uploaded_files, processing_mode, persona, job_description,
+                                             progress, run_id=job_id)
+            return {
+                'results': results,
+                'processing_mode': processing_mode,
+                'output_files': [r['output_file'] for r in results]
+            }
+        
+        try:
+            job_id = job_queue.submit(
+                processing_mode, run,
+                documents_total=len(uploaded_files),
+                cleanup=lambda: shutil.rmtree(job_dir, ignore_errors=True)
+            )
+        except QueueFullError as e:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            return jsonify({'error': str(e)}), 503
+        
+        return jsonify({'job_id': job_id, 'status_url': f"/jobs/{job_id}"}), 202
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Report status, progress and (once finished) the result of a background job"""
+    try:
+        job = job_store.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify({
+            'job_id': job['id'],
+            'status': job['status'],
+            'processing_mode': job['mode'],
+            'progress': {
+                'documents_total': job['documents_total'],
+                'documents_parsed': job['documents_parsed'],
+                'sections_embedded': job['sections_embedded']
+            },
+            'result': job['result'],
+            'error': job['error']
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/models')
+def list_models():
+    """Load time and memory metrics of the embedding models loaded in this process"""
+    return jsonify({'models': model_registry.model_metrics()})
+
+@app.route('/metrics')
+def metrics():
+    """Per-stage counters and the embedding queue histograms in Prometheus text format"""
+    return Response(instrumentation.prometheus_text(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/download/<filename>')
 def download_file(filename):
     """Download processed results"""
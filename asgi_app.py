@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Asyncio service for the PDF Intelligence System
+Serves the /upload, /download and /results API of app.py as a plain ASGI application,
+handling many requests at once: PDFs are parsed in a process pool and all embedding
+runs on one inference thread that batches the texts of concurrent requests together.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 8000
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import MultipartDecoder, Data, Field, File, Epilogue, NeedData
+from werkzeug.utils import secure_filename
+from src.embedding_cache import EmbeddingCache
+from src.document_cache import DocumentCache
+from src.document_parser import create_parser_pool, parse_in_pool
+from src.embedding_backends import create_backend
+from src.embedding_scheduler import EmbeddingScheduler
+from src.uploads import UploadBuffer, UploadedPDF
+from src import model_registry, instrumentation
+from src.utils import setup_logging
+
+config = {
+    'MAX_CONTENT_LENGTH': 16 * 1024 * 1024,  # 16MB max request size
+    'UPLOAD_SPILL_BYTES': int(os.environ.get('UPLOAD_SPILL_BYTES', 4 * 1024 * 1024)),
+    'UPLOAD_FOLDER': 'uploads',
+    'OUTPUT_FOLDER': 'output',
+    'CACHE_FOLDER': 'cache',
+    'PARSE_WORKERS': int(os.environ.get('PARSE_WORKERS', os.cpu_count() or 1)),
+    # Persona analyses run concurrently on this many threads, sharing the inference thread
+    'ANALYSIS_THREADS': int(os.environ.get('ANALYSIS_THREADS', 4)),
+    'EMBED_MAX_BATCH': int(os.environ.get('EMBED_MAX_BATCH', 64)),
+    'EMBED_MAX_WAIT_MS': float(os.environ.get('EMBED_MAX_WAIT_MS', 5)),
+    # torch intra-op threads of the inference thread; 0 uses every CPU available to the process
+    'EMBED_INTRA_OP_THREADS': int(os.environ.get('EMBED_INTRA_OP_THREADS', 0)),
+    'WARMUP_MODEL': os.environ.get('WARMUP_MODEL', '0') == '1',
+    'METRICS_ENABLED': os.environ.get('METRICS_ENABLED', '1') == '1',
+    'EMBEDDING': {
+        'backend': os.environ.get('EMBEDDING_BACKEND', 'torch'),
+        'model_path': os.environ.get('EMBEDDING_MODEL_PATH', ''),
+        'quantized': os.environ.get('EMBEDDING_QUANTIZED', '0') == '1'
+    }
+}
+
+Path(config['UPLOAD_FOLDER']).mkdir(exist_ok=True)
+Path(config['OUTPUT_FOLDER']).mkdir(exist_ok=True)
+
+setup_logging()
+instrumentation.enable(config['METRICS_ENABLED'])
+
+embedding_cache = EmbeddingCache(Path(config['CACHE_FOLDER']) / 'embeddings.db')
+document_cache = DocumentCache(Path(config['CACHE_FOLDER']) / 'documents')
+
+
+class RequestError(Exception):
+    """A request the client has to fix; carries the HTTP status"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class Service:
+    """Executors shared by all requests, started and stopped with the ASGI lifespan"""
+
+    def __init__(self):
+        self.parse_pool = None
+        self.analysis_pool = None
+        self._scheduler: Optional[EmbeddingScheduler] = None
+        self._scheduler_lock = threading.Lock()
+
+    def start(self):
+        self.parse_pool = create_parser_pool(config['PARSE_WORKERS'])
+        self.analysis_pool = ThreadPoolExecutor(max_workers=config['ANALYSIS_THREADS'],
+                                                thread_name_prefix='analysis')
+        if config['WARMUP_MODEL']:
+            self.scheduler().encode("warm up")
+
+    def scheduler(self) -> EmbeddingScheduler:
+        """The inference thread, created with the model on the first persona request"""
+        with self._scheduler_lock:
+            if self._scheduler is None:
+                self._scheduler = EmbeddingScheduler(create_backend(config['EMBEDDING']),
+                                                     max_batch_size=config['EMBED_MAX_BATCH'],
+                                                     max_wait=config['EMBED_MAX_WAIT_MS'] / 1000,
+                                                     intra_op_threads=config['EMBED_INTRA_OP_THREADS'])
+            return self._scheduler
+
+    def stop(self):
+        if self.analysis_pool:
+            self.analysis_pool.shutdown()
+        if self.parse_pool:
+            self.parse_pool.shutdown()
+        if self._scheduler:
+            self._scheduler.close()
+
+
+service = Service()
+
+
+async def run_blocking(func, *args):
+    """Run file and cache I/O on the default executor, keeping the event loop free"""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+async def parse_upload(upload: UploadedPDF) -> Optional[Dict[str, Any]]:
+    """Structure of one upload from the document cache, or parsed in the process pool"""
+    digest = upload.sha256()
+    cached = await run_blocking(document_cache.get, digest)
+    if cached:
+        return cached["structure"]
+    loop = asyncio.get_running_loop()
+    parsed = await loop.run_in_executor(service.parse_pool, parse_in_pool, upload)
+    if parsed is None:
+        return None
+    structure, sections = parsed
+    await run_blocking(document_cache.put, digest, structure, sections)
+    return structure
+
+
+def write_result(name: str, result: Dict[str, Any]) -> Path:
+    output_file = Path(config['OUTPUT_FOLDER']) / name
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    return output_file
+
+
+async def process_uploaded_files(uploaded_files: List[UploadedPDF], processing_mode: str,
+                                 persona: str = '', job_description: str = '') -> List[Dict[str, Any]]:
+    """Same outputs as app.process_uploaded_files, with the documents of a request parsed in parallel.
+
+    Output file names carry an id of the request, so concurrent requests never overwrite
+    each other's results.
+    """
+    suffix = f"_{uuid.uuid4().hex}"
+
+    async def timed_parse(upload):
+        start_time = time.time()
+        return await parse_upload(upload), time.time() - start_time
+
+    # Parsed up front in both modes; persona analysis then finds every document in the cache
+    parsed = await asyncio.gather(*(timed_parse(upload) for upload in uploaded_files))
+
+    results = []
+    if processing_mode == 'structure':
+        for pdf_file, (result, elapsed) in zip(uploaded_files, parsed):
+            if result is None:
+                # What StructureExtractor reports for a PDF it cannot open
+                result = {"title": "Error", "outline": [], "error": "Failed to load PDF"}
+            output_file = await run_blocking(write_result, f"{pdf_file.stem}_structure{suffix}.json", result)
+            results.append({
+                'filename': pdf_file.name,
+                'processing_time': f"{elapsed:.2f}s",
+                'output_file': output_file.name,
+                'title': result.get('title', 'Unknown'),
+                'sections': len(result.get('outline', []))
+            })
+
+    elif processing_mode == 'persona':
+        start_time = time.time()
+        analysis = {'persona': persona, 'job_to_be_done': job_description}
+        result = await asyncio.get_running_loop().run_in_executor(
+            service.analysis_pool, analyze, uploaded_files, analysis)
+        elapsed = time.time() - start_time
+
+        output_file = await run_blocking(write_result, f"persona_analysis{suffix}.json", result)
+        results.append({
+            'processing_time': f"{elapsed:.2f}s",
+            'output_file': output_file.name,
+            'documents_processed': len(uploaded_files),
+            'relevant_sections': len(result.get('extracted_sections', []))
+        })
+
+    return results
+
+
+def analyze(uploaded_files: List[UploadedPDF], analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Persona analysis on an analysis thread; its encode calls block on the shared batches"""
+    # Imported lazily, it pulls in torch
+    from src.persona_analyzer import PersonaAnalyzer
+    analyzer = PersonaAnalyzer(embedding_cache=embedding_cache, document_cache=document_cache,
+                               backend=service.scheduler())
+    return analyzer.analyze_documents(uploaded_files, analysis)
+
+
+async def read_form(scope, receive) -> Tuple[Dict[str, str], List[UploadedPDF], int]:
+    """Stream a multipart body into form fields and the PDF uploads of 'files[]'.
+
+    Returns the fields, the uploads and the number of non-empty 'files[]' parts.
+    """
+    content_type, options = parse_options_header(header(scope, 'content-type'))
+    if content_type != 'multipart/form-data' or 'boundary' not in options:
+        raise RequestError('No files selected')
+
+    decoder = MultipartDecoder(options['boundary'].encode(), config['MAX_CONTENT_LENGTH'])
+    fields: Dict[str, str] = {}
+    uploads: List[UploadedPDF] = []
+    file_parts = 0
+    field: Optional[Tuple[str, bytearray]] = None
+    upload: Optional[UploadBuffer] = None
+    received = 0
+    try:
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise RequestError('Client disconnected')
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            received += len(body)
+            if received > config['MAX_CONTENT_LENGTH']:
+                raise RequestError('File too large', 413)
+            decoder.receive_data(body)
+            if not more_body:
+                decoder.receive_data(None)
+
+            event = decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)):
+                if isinstance(event, File):
+                    field, upload = None, None
+                    if event.name == 'files[]' and event.filename:
+                        file_parts += 1
+                        if event.filename.endswith('.pdf'):
+                            upload = UploadBuffer(secure_filename(event.filename),
+                                                  config['UPLOAD_SPILL_BYTES'], Path(config['UPLOAD_FOLDER']))
+                elif isinstance(event, Field):
+                    field, upload = (event.name, bytearray()), None
+                elif isinstance(event, Data):
+                    if upload is not None:
+                        # Chunks kept in memory are copied right here; file writes go to a thread
+                        if upload.spills(len(event.data)):
+                            await run_blocking(upload.write, event.data)
+                        else:
+                            upload.write(event.data)
+                        if not event.more_data:
+                            uploads.append(await run_blocking(upload.finish) if upload.spills()
+                                           else upload.finish())
+                            upload = None
+                    elif field is not None:
+                        field[1].extend(event.data)
+                        if not event.more_data:
+                            fields[field[0]] = field[1].decode('utf-8', errors='replace')
+                            field = None
+                event = decoder.next_event()
+    except Exception as e:
+        if upload is not None:
+            await run_blocking(upload.discard)
+        await run_blocking(close_uploads, uploads)
+        if isinstance(e, RequestError):
+            raise
+        raise RequestError(f'Malformed upload: {str(e)}') from e
+    return fields, uploads, file_parts
+
+
+def close_uploads(uploads: List[UploadedPDF]):
+    """Release the buffers and delete any spill files"""
+    for upload in uploads:
+        upload.close()
+
+
+def header(scope, name: str) -> str:
+    target = name.encode('latin-1')
+    for key, value in scope.get('headers', []):
+        if key.lower() == target:
+            return value.decode('latin-1')
+    return ''
+
+
+async def send_response(send, status: int, body: bytes, content_type: str,
+                        headers: Optional[List[Tuple[bytes, bytes]]] = None):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type.encode('latin-1')),
+                    (b'content-length', str(len(body)).encode('latin-1'))] + (headers or [])
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, payload: Dict[str, Any], status: int = 200):
+    await send_response(send, status, json.dumps(payload).encode('utf-8'), 'application/json')
+
+
+async def index(scope, receive, send):
+    """Main page"""
+    page = await run_blocking((Path(__file__).parent / 'templates' / 'index.html').read_bytes)
+    await send_response(send, 200, page, 'text/html; charset=utf-8')
+
+
+async def upload_files(scope, receive, send):
+    """Handle file upload and processing"""
+    try:
+        form, uploaded_files, file_parts = await read_form(scope, receive)
+    except RequestError as e:
+        await send_json(send, {'error': str(e)}, e.status)
+        return
+
+    try:
+        processing_mode = form.get('mode', 'structure')
+        persona = form.get('persona', '')
+        job_description = form.get('job_description', '')
+
+        if not file_parts:
+            await send_json(send, {'error': 'No files selected'}, 400)
+            return
+
+        if processing_mode == 'persona' and (not persona or not job_description):
+            await send_json(send, {'error': 'Persona and job description required for persona analysis'}, 400)
+            return
+
+        if not uploaded_files:
+            await send_json(send, {'error': 'No valid PDF files uploaded'}, 400)
+            return
+
+        results = await process_uploaded_files(uploaded_files, processing_mode, persona, job_description)
+        await send_json(send, {
+            'success': True,
+            'results': results,
+            'processing_mode': processing_mode
+        })
+
+    except Exception as e:
+        await send_json(send, {'error': str(e)}, 500)
+    finally:
+        await run_blocking(close_uploads, uploaded_files)
+
+
+async def download_file(scope, receive, send, filename: str):
+    """Download processed results"""
+    try:
+        file_path = Path(config['OUTPUT_FOLDER']) / secure_filename(filename)
+        if not file_path.is_file():
+            await send_json(send, {'error': 'File not found'}, 404)
+            return
+        disposition = f'attachment; filename="{file_path.name}"'.encode('latin-1', errors='replace')
+        await send_response(send, 200, await run_blocking(file_path.read_bytes), 'application/json',
+                            [(b'content-disposition', disposition)])
+    except Exception as e:
+        await send_json(send, {'error': str(e)}, 500)
+
+
+async def list_results(scope, receive, send):
+    """List all available result files"""
+    try:
+        await send_json(send, {'files': await run_blocking(result_files)})
+    except Exception as e:
+        await send_json(send, {'error': str(e)}, 500)
+
+
+def result_files() -> List[Dict[str, Any]]:
+    files = []
+    for file_path in Path(config['OUTPUT_FOLDER']).glob('*.json'):
+        stat = file_path.stat()
+        files.append({
+            'name': file_path.name,
+            'size': f"{stat.st_size / 1024:.1f} KB",
+            'modified': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stat.st_mtime))
+        })
+    return files
+
+
+async def list_models(scope, receive, send):
+    """Load time and memory metrics of the embedding models loaded in this process"""
+    await send_json(send, {'models': model_registry.model_metrics()})
+
+
+async def metrics(scope, receive, send):
+    """Per-stage counters and the embedding queue histograms in Prometheus text format"""
+    await send_response(send, 200, instrumentation.prometheus_text().encode('utf-8'),
+                        'text/plain; version=0.0.4')
+
+
+ROUTES = {
+    ('GET', '/'): index,
+    ('POST', '/upload'): upload_files,
+    ('GET', '/results'): list_results,
+    ('GET', '/models'): list_models,
+    ('GET', '/metrics'): metrics,
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                service.start()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            service.stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    method, path = scope['method'], scope['path']
+    route = ROUTES.get((method, path))
+    if route is not None:
+        await route(scope, receive, send)
+    elif method == 'GET' and path.startswith('/download/'):
+        await download_file(scope, receive, send, path[len('/download/'):])
+    else:
+        await send_json(send, {'error': 'Not found'}, 404)
+
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        print("❌ uvicorn is required to serve asgi_app (pip install uvicorn)")
+        raise SystemExit(1)
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 8000)))
@@ -0,0 +1,7 @@
+"""
+Entry point: python -m bench [--repeat N] [--synthetic-pages 10 100] [--baseline report.json]
+"""
+
+from .runner import main
+
+raise SystemExit(main())
@@ -0,0 +1,213 @@
+"""
+Stage-by-stage benchmarks of ingestion, structure extraction and persona ranking
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Callable, Optional
+
+import fitz  # PyMuPDF
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.pdf_processor import PDFProcessor
+from src.structure_extractor import StructureExtractor
+from src.utils import get_rss_bytes, get_peak_rss_bytes, load_json_safely
+from .synthetic import generate_pdf
+
+# Latency fields compared against a baseline; lower is better for all of them
+COMPARED_FIELDS = ("p50_ms", "p95_ms")
+
+
+def summarize(latencies: List[float], pages: int, sections: int, rss_before: int) -> Dict[str, Any]:
+    """Latency percentiles and throughput of one stage; pages/sections are per timed run"""
+    total = sum(latencies)
+    return {
+        "runs": len(latencies),
+        "total_s": round(total, 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 3),
+        "pages_per_s": round(pages * len(latencies) / total, 2) if total else None,
+        "sections_per_s": round(sections * len(latencies) / total, 2) if total and sections else None,
+        "rss_delta_bytes": get_rss_bytes() - rss_before,
+        "peak_rss_bytes": get_peak_rss_bytes()
+    }
+
+
+def time_stage(run: Callable[[Path], int], pdf_files: List[Path], repeat: int) -> List[float]:
+    """Seconds per call of run(pdf) for every file, repeated; one untimed warm-up call first"""
+    run(pdf_files[0])
+    latencies = []
+    for _ in range(repeat):
+        for pdf in pdf_files:
+            start = time.perf_counter()
+            run(pdf)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_corpus(pdf_files: List[Path], repeat: int, persona_config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    processor = PDFProcessor()
+    pages = 0
+    sections = 0
+    for pdf in pdf_files:
+        processor.load_pdf(pdf)
+        pages += processor.page_count
+        sections += len(processor.extract_sections_by_formatting())
+        processor.close()
+    # Per-file stages run once per document, so throughput uses the per-document average
+    pages_per_doc = pages / len(pdf_files)
+    sections_per_doc = sections / len(pdf_files)
+    stages = {}
+
+    def load(pdf: Path) -> int:
+        processor.load_pdf(pdf)
+        processor.close()
+        return 0
+
+    rss = get_rss_bytes()
+    stages["load_pdf"] = summarize(time_stage(load, pdf_files, repeat), pages_per_doc, 0, rss)
+
+    # Time section detection alone, on documents that are already loaded
+    loaded = {}
+    for pdf in pdf_files:
+        loaded[pdf] = PDFProcessor()
+        loaded[pdf].load_pdf(pdf)
+    rss = get_rss_bytes()
+    stages["extract_sections_by_formatting"] = summarize(
+        time_stage(lambda pdf: len(loaded[pdf].extract_sections_by_formatting()), pdf_files, repeat),
+        pages_per_doc, sections_per_doc, rss
+    )
+    for p in loaded.values():
+        p.close()
+    loaded.clear()
+
+    extractor = StructureExtractor()
+    rss = get_rss_bytes()
+    stages["extract_structure"] = summarize(
+        time_stage(lambda pdf: len(extractor.extract_structure(pdf)["outline"]), pdf_files, repeat),
+        pages_per_doc, sections_per_doc, rss
+    )
+
+    if persona_config is not None:
+        stages["analyze_documents"] = bench_persona(pdf_files, repeat, persona_config, pages, sections)
+
+    return {"documents": len(pdf_files), "pages": pages, "sections": sections, "stages": stages}
+
+
+def bench_persona(pdf_files: List[Path], repeat: int, config: Dict[str, Any],
+                  pages: int, sections: int) -> Dict[str, Any]:
+    """One timed run ranks the whole corpus; the embedding model load is not timed"""
+    try:
+        from src.persona_analyzer import PersonaAnalyzer
+        analyzer = PersonaAnalyzer()
+        analyzer.backend.encode("warm up")
+    except ImportError as e:
+        print(f"Skipping analyze_documents: {str(e)}")
+        return {"skipped": str(e)}
+
+    rss = get_rss_bytes()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        analyzer.analyze_documents(pdf_files, config)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies, pages, sections, rss)
+
+
+def compare_reports(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Stages whose latency grew by more than `tolerance` (a fraction) over the baseline"""
+    regressions = []
+    for corpus, result in current["corpora"].items():
+        base_corpus = baseline.get("corpora", {}).get(corpus)
+        if not base_corpus:
+            continue
+        for stage, stats in result["stages"].items():
+            base_stats = base_corpus["stages"].get(stage)
+            if not base_stats or "skipped" in stats or "skipped" in base_stats:
+                continue
+            for field in COMPARED_FIELDS:
+                old, new = base_stats[field], stats[field]
+                if old and new > old * (1 + tolerance):
+                    regressions.append(f"{corpus}/{stage} {field}: {old} -> {new} (+{(new / old - 1) * 100:.1f}%)")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="PDF Intelligence System benchmarks")
+    parser.add_argument("--corpus", type=Path, default=ROOT / "input",
+                        help="directory of real PDFs to benchmark (default: input/)")
+    parser.add_argument("--no-corpus", action="store_true", help="only run the synthetic documents")
+    parser.add_argument("--synthetic-pages", type=int, nargs="*", default=[10, 100],
+                        help="page counts of the generated documents (default: 10 100)")
+    parser.add_argument("--headings-per-page", type=int, default=3,
+                        help="heading density of the generated documents (default: 3)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per document (default: 5)")
+    parser.add_argument("--skip-persona", action="store_true",
+                        help="do not time PersonaAnalyzer.analyze_documents (needs the embedding model)")
+    parser.add_argument("--output", type=Path, default=None, help="also write the JSON report here")
+    parser.add_argument("--baseline", type=Path, default=None,
+                        help="earlier report to compare against; exits with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="allowed latency growth over the baseline as a fraction (default: 0.15)")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    persona_config = None
+    if not args.skip_persona:
+        persona_config = load_json_safely(args.corpus / "persona_config.json") or {
+            "persona": "Travel Planner", "job_to_be_done": "Plan a trip"
+        }
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pymupdf": fitz.VersionBind,
+        "repeat": args.repeat,
+        "corpora": {}
+    }
+
+    if not args.no_corpus:
+        pdf_files = sorted(args.corpus.glob("*.pdf"))
+        if pdf_files:
+            print(f"Benchmarking {len(pdf_files)} document(s) from {args.corpus}...")
+            report["corpora"]["input"] = bench_corpus(pdf_files, args.repeat, persona_config)
+        else:
+            print(f"No PDF files found in {args.corpus}, skipping the corpus run")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.synthetic_pages:
+            name = f"synthetic-{pages}p-{args.headings_per_page}h"
+            print(f"Benchmarking {name}...")
+            pdf = generate_pdf(Path(tmp) / f"{name}.pdf", pages=pages,
+                               headings_per_page=args.headings_per_page)
+            report["corpora"][name] = bench_corpus([pdf], args.repeat, persona_config)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        baseline = load_json_safely(args.baseline)
+        if baseline is None:
+            return 2
+        regressions = compare_reports(report, baseline, args.tolerance)
+        if regressions:
+            print("❌ Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("✅ No regressions against baseline")
+    return 0
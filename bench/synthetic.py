@@ -0,0 +1,74 @@
+"""
+Synthetic PDF generation for benchmarks, written locally with PyMuPDF
+"""
+
+import random
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+_WORDS = (
+    "coast village market harbour museum festival vineyard river bridge chapel garden "
+    "cuisine olive lavender castle square fountain tradition route beach island valley "
+    "history culture season train ticket hotel restaurant wine cheese bread walk tour"
+).split()
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 56
+BODY_SIZE = 10
+LINE_HEIGHT = 14
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _heading(rng: random.Random, number: str) -> str:
+    return f"{number} " + " ".join(w.capitalize() for w in rng.sample(_WORDS, 3))
+
+
+def generate_pdf(path: Path, pages: int = 10, headings_per_page: int = 3,
+                 lines_per_section: int = 8, seed: int = 0) -> Path:
+    """Write a PDF of `pages` pages with numbered bold headings followed by body lines.
+
+    The first page starts with a large title; H1/H2 headings alternate so both the
+    font rules and the numbering rules of the heading classifier are exercised.
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    chapter = 0
+    sub = 0
+    for page_num in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        y = MARGIN
+        if page_num == 0:
+            page.insert_text((MARGIN, y + 20), "Synthetic Benchmark Document", fontsize=22, fontname="hebo")
+            y += 48
+        for h in range(headings_per_page):
+            if h % 2 == 0:
+                chapter += 1
+                sub = 0
+                page.insert_text((MARGIN, y + 16), _heading(rng, f"{chapter}."), fontsize=16, fontname="hebo")
+                y += 26
+            else:
+                sub += 1
+                page.insert_text((MARGIN, y + 14), _heading(rng, f"{chapter}.{sub}"), fontsize=13, fontname="hebo")
+                y += 22
+            for _ in range(lines_per_section):
+                if y > PAGE_HEIGHT - MARGIN:
+                    break
+                page.insert_text((MARGIN, y + BODY_SIZE), _sentence(rng, rng.randint(8, 12)),
+                                 fontsize=BODY_SIZE, fontname="helv")
+                y += LINE_HEIGHT
+            y += 6
+            if y > PAGE_HEIGHT - MARGIN:
+                break
+        # Fill what is left of the page with body text that continues the last section
+        while y <= PAGE_HEIGHT - MARGIN - LINE_HEIGHT:
+            page.insert_text((MARGIN, y + BODY_SIZE), _sentence(rng, rng.randint(8, 12)),
+                             fontsize=BODY_SIZE, fontname="helv")
+            y += LINE_HEIGHT
+    doc.save(path)
+    doc.close()
+    return path
@@ -1,21 +1,90 @@
 from pathlib import Path
+import argparse
 import json
+import re
 import time
-from src.persona_analyzer import PersonaAnalyzer
 from src.utils import setup_logging, load_json_safely
+from src import instrumentation
 
-def main():
-    setup_logging()
+def parse_args():
+    parser = argparse.ArgumentParser(description="PDF Intelligence System")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes used to parse PDFs (default: 1)")
+    parser.add_argument("--page-workers", type=int, default=1,
+                        help="number of processes used to split the pages of a single large PDF (default: 1)")
+    parser.add_argument("--no-timings", action="store_true",
+                        help="do not record per-stage timings in persona_analysis.json")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile the run per document and stage into output/profiles/ (parses in-process)")
+    parser.set_defaults(index=None, incremental=False, personas=None)
+    subparsers = parser.add_subparsers(dest="command")
+    persona = subparsers.add_parser("persona", help="persona-driven analysis (Round 1B, default)")
+    persona.add_argument("--index", type=Path, default=None,
+                         help="answer from a prebuilt section index instead of parsing input/")
+    persona.add_argument("--nprobe", type=int, default=None,
+                         help="search only this many IVF lists of the index (approximate, faster)")
+    persona.add_argument("--personas", type=Path, default=None,
+                         help="JSON list or JSONL file of persona configs answered in one pass, "
+                              "one output file each (persona_config.json may also hold a list)")
+    persona.add_argument("--incremental", action="store_true",
+                         help="update the index (default: cache/index) with only the added, changed and "
+                              "removed PDFs of input/, then rank from it")
+    subparsers.add_parser("structure", help="title and outline extraction only (Round 1A, no ML models)")
+    index = subparsers.add_parser("index", help="embed every section of input/ once into a reusable index")
+    index.add_argument("--index-dir", type=Path, default=Path("cache") / "index",
+                       help="where to write the index (default: cache/index)")
+    index.add_argument("--append", action="store_true",
+                       help="only add documents whose file names are not in the index yet "
+                            "(modified PDFs are not re-indexed; use --incremental for that)")
+    index.add_argument("--ann-lists", type=int, default=0,
+                       help="also build an IVF with this many lists for approximate search")
+    index.add_argument("--incremental", action="store_true",
+                       help="re-process only PDFs added, changed or removed since the last run")
+    watch = subparsers.add_parser("watch", help="keep ingesting PDFs that land in input/ into the index")
+    watch.add_argument("--index-dir", type=Path, default=Path("cache") / "index",
+                       help="index kept up to date (default: cache/index)")
+    watch.add_argument("--debounce", type=float, default=2.0,
+                       help="seconds a file must stay unchanged before it is ingested (default: 2)")
+    watch.add_argument("--poll-interval", type=float, default=1.0,
+                       help="directory scan interval when inotify is not used (default: 1)")
+    watch.add_argument("--polling", action="store_true", help="scan the directory instead of using inotify")
+    watch.add_argument("--ann-lists", type=int, default=0,
+                       help="also maintain an IVF with this many lists for approximate search")
+    return parser.parse_args()
 
-    input_dir = Path("input")
-    output_dir = Path("output")
-    output_dir.mkdir(parents=True, exist_ok=True)
+def run_structure(args, pdf_files, output_dir, cache_dir):
+    # Only the PDF stack is imported here; torch and sentence_transformers stay unloaded
+    from src.document_parser import DocumentParser, iter_parsed_documents
+    from src.document_cache import DocumentCache
 
-    pdf_files = list(input_dir.glob("*.pdf"))
-    if not pdf_files:
-        print("❌ No PDF files found in /input folder.")
-        return
+    print("🔍 Running Structure Extractor (Round 1A)...")
+    document_cache = DocumentCache(cache_dir / "documents")
+    results = {}
+    digests = {}
+    for pdf_file in pdf_files:
+        digests[pdf_file] = document_cache.fingerprint(pdf_file)
+        cached = document_cache.get(digests[pdf_file])
+        if cached:
+            results[pdf_file] = cached["structure"]
+    # Parsed with their sections, so a later persona run finds them in the cache too
+    parser = DocumentParser(page_workers=args.page_workers)
+    misses = [pdf_file for pdf_file in pdf_files if pdf_file not in results]
+    try:
+        for pdf_file, document in iter_parsed_documents(misses, workers=args.workers, parser=parser):
+            if document:
+                results[pdf_file] = document[0]
+                document_cache.put(digests[pdf_file], *document)
+            else:
+                # Reports why the PDF could not be loaded
+                results[pdf_file] = parser.extractor.extract_structure(pdf_file)
+    finally:
+        parser.close()
+    for pdf_file in pdf_files:
+        with open(output_dir / f"{pdf_file.stem}_structure.json", "w", encoding="utf-8") as f:
+            json.dump(results[pdf_file], f, indent=2, ensure_ascii=False)
+    print(f"✅ Round 1A complete. Wrote {len(pdf_files)} structure file(s) to output/")
 
+def load_persona_config(input_dir):
     config_path = input_dir / "persona_config.json"
     if not config_path.exists():
         # Create a default config file if missing
@@ -26,14 +95,190 @@ def main():
         with open(config_path, "w", encoding="utf-8") as f:
             json.dump(default_config, f, indent=2)
         print("⚠️ persona_config.json not found. Created a default config.")
+    return load_json_safely(config_path)
+
+def load_persona_configs(path):
+    """Persona configs from a JSON object, a JSON list or a JSONL file.
+
+    Raises ValueError naming the line of a JSONL entry that is not valid JSON.
+    """
+    if path.suffix == ".jsonl":
+        configs = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    configs.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path}, line {line_number}: {e.msg} (column {e.colno})") from e
+        return configs
+    configs = load_json_safely(path)
+    if configs is None:
+        return []
+    return configs if isinstance(configs, list) else [configs]
+
+def persona_output_name(config, position):
+    if config.get("id"):
+        return f"persona_analysis_{re.sub(r'[^A-Za-z0-9_-]+', '_', str(config['id']))}.json"
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', config.get("persona", "")).strip("_")[:40]
+    return f"persona_analysis_{position:03d}_{slug or 'persona'}.json"
+
+def persona_output_names(configs):
+    """Output file name of every config; raises ValueError if two of them would share one"""
+    names = [persona_output_name(config, position) for position, config in enumerate(configs, start=1)]
+    owners = {}
+    for position, (config, name) in enumerate(zip(configs, names), start=1):
+        owners.setdefault(name, []).append(str(config.get("id") or f"#{position}"))
+    clashes = [f"{', '.join(ids)} -> {name}" for name, ids in owners.items() if len(ids) > 1]
+    if clashes:
+        raise ValueError("persona configs would overwrite each other's output "
+                         f"(ids must be unique after replacing characters other than A-Z, a-z, 0-9, _ and -): "
+                         f"{'; '.join(clashes)}")
+    return names
+
+def create_analyzer(args, config, cache_dir):
+    from src.persona_analyzer import PersonaAnalyzer
+    from src.embedding_backends import create_backend
+    from src.embedding_cache import EmbeddingCache
+    from src.document_cache import DocumentCache
+
+    if isinstance(config, list):
+        # A list of personas shares one embedding setup, taken from the first entry
+        config = config[0] if config else {}
+    return PersonaAnalyzer(
+        embedding_cache=EmbeddingCache(cache_dir / "embeddings.db"),
+        document_cache=DocumentCache(cache_dir / "documents"),
+        workers=args.workers,
+        page_workers=args.page_workers,
+        backend=create_backend(config.get("embedding"))
+    )
+
+def run_index(args, pdf_files, input_dir, cache_dir):
+    config = load_persona_config(input_dir)
+    print("🔍 Building section index...")
+    analyzer = create_analyzer(args, config, cache_dir)
+    if args.incremental:
+        changes = analyzer.sync_index(pdf_files, args.index_dir, ann_lists=args.ann_lists)
+        print(f"✅ Index at {args.index_dir} updated: {changes.summary()}")
+        return
+    count = analyzer.build_index(pdf_files, args.index_dir, append=args.append, ann_lists=args.ann_lists)
+    print(f"✅ Index at {args.index_dir} now holds {count} sections")
+
+def run_watch(args, input_dir, cache_dir):
+    import signal
+    import threading
+    from src.corpus_watcher import CorpusWatcher
+
+    config = load_persona_config(input_dir)
+    analyzer = create_analyzer(args, config, cache_dir)
+
+    def ingest(pdf_files):
+        changes = analyzer.sync_index(pdf_files, args.index_dir, ann_lists=args.ann_lists)
+        if changes:
+            print(f"📚 Ingested into {args.index_dir}: {changes.summary()}")
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    watcher = CorpusWatcher(input_dir, ingest, debounce=args.debounce,
+                            poll_interval=args.poll_interval, use_inotify=not args.polling)
+    print(f"👀 Watching {input_dir} (parse workers: {args.workers}); persona queries can use --index {args.index_dir}")
+    try:
+        watcher.run(stop)
+    except KeyboardInterrupt:
+        pass
+    print("Stopped watching")
 
+def run_personas(args, configs, pdf_files, output_dir, cache_dir):
+    try:
+        names = persona_output_names(configs)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    print(f"🔍 Running Persona Analyzer (Round 1B) for {len(configs)} personas...")
+    analyzer = create_analyzer(args, configs, cache_dir)
+    if args.nprobe is not None:
+        print("⚠️ --nprobe is ignored for multiple personas; the index is searched exactly")
+    if args.incremental or args.index:
+        from src.vector_index import SectionIndex
+        index_dir = args.index or cache_dir / "index"
+        if args.incremental:
+            changes = analyzer.sync_index(pdf_files, index_dir)
+            print(f"📚 Corpus changes since the last run: {changes.summary()}")
+        results = analyzer.query_index_many(SectionIndex(index_dir), configs)
+    else:
+        results = analyzer.analyze_many(pdf_files, configs)
+    for name, result in zip(names, results):
+        with open(output_dir / name, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    print(f"✅ Round 1B complete. Wrote {len(results)} persona_analysis_*.json file(s) to output/")
+
+def run_persona(args, pdf_files, input_dir, output_dir, cache_dir):
+    try:
+        config = load_persona_configs(args.personas) if args.personas else load_persona_config(input_dir)
+    except ValueError as e:
+        print(f"❌ Invalid persona configs: {e}")
+        return
+    if isinstance(config, list):
+        if not config:
+            print("❌ No persona configs found.")
+            return
+        run_personas(args, config, pdf_files, output_dir, cache_dir)
+        return
     print("🔍 Running Persona Analyzer (Round 1B)...")
-    config = load_json_safely(config_path)
-    analyzer = PersonaAnalyzer()
-    result = analyzer.analyze_documents(pdf_files, config)
+    analyzer = create_analyzer(args, config, cache_dir)
+    if args.incremental:
+        from src.vector_index import SectionIndex
+        index_dir = args.index or cache_dir / "index"
+        changes = analyzer.sync_index(pdf_files, index_dir)
+        print(f"📚 Corpus changes since the last run: {changes.summary()}")
+        result = analyzer.query_index(SectionIndex(index_dir), config, nprobe=args.nprobe)
+    elif args.index:
+        from src.vector_index import SectionIndex
+        result = analyzer.query_index(SectionIndex(args.index), config, nprobe=args.nprobe)
+    else:
+        result = analyzer.analyze_documents(pdf_files, config)
     with open(output_dir / "persona_analysis.json", "w", encoding="utf-8") as f:
         json.dump(result, f, indent=2)
     print("✅ Round 1B complete. Check output/persona_analysis.json")
 
+def main():
+    args = parse_args()
+    setup_logging()
+    instrumentation.enable(not args.no_timings)
+
+    input_dir = Path("input")
+    output_dir = Path("output")
+    cache_dir = Path("cache")
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.command == "watch":
+        run_watch(args, input_dir, cache_dir)
+        return
+
+    pdf_files = list(input_dir.glob("*.pdf"))
+    if not pdf_files and not (args.index or args.incremental):
+        print("❌ No PDF files found in /input folder.")
+        return
+
+    session = None
+    if args.profile:
+        from src.profiling import ProfileSession
+        # Pool processes are not profiled, so everything runs in this one
+        args.workers = args.page_workers = 1
+        session = ProfileSession.try_start(output_dir / "profiles" / time.strftime("%Y%m%d-%H%M%S"))
+
+    try:
+        if args.command == "structure":
+            run_structure(args, pdf_files, output_dir, cache_dir)
+        elif args.command == "index":
+            run_index(args, pdf_files, input_dir, cache_dir)
+        else:
+            run_persona(args, pdf_files, input_dir, output_dir, cache_dir)
+    finally:
+        if session:
+            files = session.stop()
+            print(f"📈 Wrote {len(files)} profile file(s) to {session.output_dir}")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,180 @@
+"""
+Approximate nearest-neighbour search over a SectionIndex with a pure-NumPy IVF structure.
+
+Sections are bucketed under the nearest of `nlist` k-means centroids; a query only scores
+the rows of its `nprobe` closest buckets. Raising nprobe trades speed for recall, and
+nprobe == nlist is exact search.
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+IVF_FILE = "ivf.npz"
+# Rows scored per matrix product while assigning, to bound temporary memory
+_ASSIGN_CHUNK = 65536
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.clip(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12, None)
+
+
+class IVFIndex:
+    """Inverted-file index: k-means centroids plus the bucket of every indexed row"""
+
+    def __init__(self, centroids: np.ndarray, assignments: Optional[np.ndarray] = None):
+        self.centroids = _normalise(centroids)
+        self.assignments = (np.asarray(assignments, dtype=np.int32) if assignments is not None
+                            else np.zeros(0, dtype=np.int32))
+        self._lists: Optional[List[np.ndarray]] = None
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: int, iterations: int = 10,
+              train_sample: int = 100_000, seed: int = 0) -> "IVFIndex":
+        """Spherical k-means on (a sample of) the unit-length rows"""
+        rng = np.random.default_rng(seed)
+        count = len(vectors)
+        nlist = max(1, min(nlist, count))
+        sample_rows = np.sort(rng.choice(count, size=min(train_sample, count), replace=False))
+        sample = _normalise(vectors[sample_rows])
+
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty buckets from random rows so every list stays useful
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = _normalise(sums)
+        return cls(centroids)
+
+    def add(self, vectors: np.ndarray):
+        """Assign new rows (appended after the existing ones) to their nearest bucket"""
+        parts = [self.assignments]
+        for start in range(0, len(vectors), _ASSIGN_CHUNK):
+            chunk = _normalise(vectors[start:start + _ASSIGN_CHUNK])
+            parts.append(np.argmax(chunk @ self.centroids.T, axis=1).astype(np.int32))
+        self.assignments = np.concatenate(parts)
+        self._lists = None
+
+    def _inverted_lists(self) -> List[np.ndarray]:
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind="stable")
+            bounds = np.searchsorted(self.assignments[order], np.arange(self.nlist + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(self.nlist)]
+        return self._lists
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Sorted row ids in the nprobe buckets closest to query"""
+        nprobe = max(1, min(nprobe, self.nlist))
+        centroid_scores = self.centroids @ _normalise(query)
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        lists = self._inverted_lists()
+        return np.sort(np.concatenate([lists[p] for p in probes]))
+
+    def save(self, index_dir: Path):
+        # Replaced in one rename, as readers may load the IVF of the published version
+        tmp_path = Path(index_dir) / (IVF_FILE + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, centroids=self.centroids, assignments=self.assignments)
+        tmp_path.replace(Path(index_dir) / IVF_FILE)
+
+    @classmethod
+    def load(cls, index_dir: Path) -> Optional["IVFIndex"]:
+        path = Path(index_dir) / IVF_FILE
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            return cls(data["centroids"], data["assignments"])
+
+
+def update_ivf(index_dir: Path, vectors: np.ndarray, nlist: int) -> IVFIndex:
+    """Train an IVF for the index on first use, otherwise bucket only the rows it has not seen.
+
+    index_dir is the directory of the index version (SectionIndex.index_dir).
+    """
+    ivf = IVFIndex.load(index_dir)
+    if ivf is None or len(ivf.assignments) > len(vectors) or ivf.centroids.shape[1] != vectors.shape[1]:
+        ivf = IVFIndex.train(vectors, nlist)
+    ivf.add(vectors[len(ivf.assignments):])
+    ivf.save(index_dir)
+    return ivf
+
+
+def benchmark(index, queries: np.ndarray, top_k: int = 5, threshold: float = 0.2,
+              nprobes: Sequence[int] = (1, 2, 4, 8, 16)) -> Dict[str, Any]:
+    """recall@k and per-query latency of IVF search against exact search on a SectionIndex"""
+    exact_results = []
+    start = time.perf_counter()
+    for q in queries:
+        exact_results.append([row for row, _ in index.search(q, top_k, threshold)])
+    exact_ms = (time.perf_counter() - start) * 1000 / max(len(queries), 1)
+
+    report = {"sections": index.count, "queries": len(queries), "top_k": top_k,
+              "exact_ms_per_query": round(exact_ms, 3), "ivf": []}
+    for nprobe in nprobes:
+        hits = total = 0
+        start = time.perf_counter()
+        approx_results = [[row for row, _ in index.search(q, top_k, threshold, nprobe=nprobe)]
+                          for q in queries]
+        approx_ms = (time.perf_counter() - start) * 1000 / max(len(queries), 1)
+        for exact, approx in zip(exact_results, approx_results):
+            hits += len(set(exact) & set(approx))
+            total += len(exact)
+        report["ivf"].append({
+            "nprobe": nprobe,
+            f"recall@{top_k}": round(hits / total, 4) if total else 1.0,
+            "ms_per_query": round(approx_ms, 3),
+            "speedup": round(exact_ms / approx_ms, 2) if approx_ms else None
+        })
+    return report
+
+
+def main():
+    from .vector_index import SectionIndex, index_lock
+    import json
+
+    parser = argparse.ArgumentParser(description="IVF approximate search tools for a section index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="train the IVF of an existing index (or add new rows)")
+    build.add_argument("index_dir", type=Path)
+    build.add_argument("--nlist", type=int, default=256)
+    bench = subparsers.add_parser("bench", help="compare IVF recall and latency with exact search")
+    bench.add_argument("index_dir", type=Path)
+    bench.add_argument("--queries", type=int, default=200)
+    bench.add_argument("--top-k", type=int, default=5)
+    bench.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    bench.add_argument("--noise", type=float, default=0.05,
+                       help="perturbation applied to sampled rows to form queries")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        with index_lock(args.index_dir):
+            index = SectionIndex(args.index_dir)
+            ivf = update_ivf(index.index_dir, index.vectors, args.nlist)
+        print(f"IVF with {ivf.nlist} lists over {len(ivf.assignments)} sections")
+        return 0
+
+    index = SectionIndex(args.index_dir)
+
+    if index.ann is None:
+        parser.error("index has no IVF yet; run the build command first")
+    rng = np.random.default_rng(0)
+    rows = rng.choice(index.count, size=min(args.queries, index.count), replace=False)
+    queries = index.vectors[rows] + rng.normal(0, args.noise, size=(len(rows), index.dim)).astype(np.float32)
+    print(json.dumps(benchmark(index, queries, args.top_k, nprobes=args.nprobe), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,79 @@
+"""
+Manifest of the content hashes behind an incrementally maintained section index
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Any, List, Sequence
+
+from .document_cache import file_sha256
+
+MANIFEST_FILE = "manifest.json"
+
+
+class CorpusChanges:
+    """How the PDFs on disk differ from the manifest, by file name"""
+
+    def __init__(self, added: List[str], changed: List[str], removed: List[str],
+                 unchanged: List[str], entries: Dict[str, Dict[str, Any]]):
+        self.added = added
+        self.changed = changed
+        self.removed = removed
+        self.unchanged = unchanged
+        # Fresh manifest entries of every file currently on disk
+        self.entries = entries
+
+    @property
+    def stale(self) -> List[str]:
+        """Documents whose rows must leave the index"""
+        return self.changed + self.removed
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def summary(self) -> Dict[str, int]:
+        return {"added": len(self.added), "changed": len(self.changed),
+                "removed": len(self.removed), "unchanged": len(self.unchanged)}
+
+
+class CorpusManifest:
+    """File name -> size, mtime and sha256 of every document in the index.
+
+    Files whose size and mtime match their entry are not re-hashed, so a run over a
+    large, mostly unchanged library only stats each file.
+    """
+
+    def __init__(self, index_dir: Path):
+        self.path = Path(index_dir) / MANIFEST_FILE
+        self.files: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+
+    def diff(self, pdf_files: Sequence[Path]) -> CorpusChanges:
+        added, changed, unchanged = [], [], []
+        entries = {}
+        for pdf in pdf_files:
+            stat = pdf.stat()
+            known = self.files.get(pdf.name)
+            if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+                digest = known["sha256"]
+            else:
+                digest = file_sha256(pdf)
+            entries[pdf.name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+            if known is None:
+                added.append(pdf.name)
+            elif known["sha256"] != digest:
+                changed.append(pdf.name)
+            else:
+                unchanged.append(pdf.name)
+        removed = [name for name in self.files if name not in entries]
+        return CorpusChanges(added, changed, removed, unchanged, entries)
+
+    def save(self, entries: Dict[str, Dict[str, Any]]):
+        """Replace the manifest; written after the index so a crash only causes re-processing"""
+        self.files = dict(entries)
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, indent=1, ensure_ascii=False)
+        tmp_path.replace(self.path)
@@ -0,0 +1,186 @@
+"""
+Watches the input directory and hands settled PDFs to an ingestion callback.
+
+Change events come from inotify on Linux (through libc, no extra dependency) and from
+periodic directory scans elsewhere. A file is only reported once it has produced no
+events for `debounce` seconds and its size and mtime stopped moving, so PDFs that are
+still being copied in are not parsed half-written.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# inotify event bits (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Reported instead of a file name when the whole directory has to be rescanned
+RESCAN = "*"
+
+
+def _is_pdf(name: str) -> bool:
+    return name.lower().endswith(".pdf") and not name.startswith(".")
+
+
+class InotifySource:
+    """Names of entries in a directory that changed, read from an inotify descriptor"""
+
+    def __init__(self, directory: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self._fd, str(directory).encode(), _WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def wait(self, timeout: float) -> Set[str]:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        names = set()
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="surrogateescape")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                names.add(RESCAN)
+            elif _is_pdf(name):
+                names.add(name)
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingSource:
+    """Names of PDFs whose size or mtime changed (or that appeared or vanished) between scans"""
+
+    def __init__(self, directory: Path, interval: float = 1.0):
+        self.directory = directory
+        self.interval = interval
+        self._seen = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        seen = {}
+        for path in self.directory.glob("*"):
+            if _is_pdf(path.name):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                seen[path.name] = (stat.st_size, stat.st_mtime_ns)
+        return seen
+
+    def wait(self, timeout: float) -> Set[str]:
+        time.sleep(min(timeout, self.interval))
+        current = self._scan()
+        changed = {name for name, sig in current.items() if self._seen.get(name) != sig}
+        changed |= set(self._seen) - set(current)
+        self._seen = current
+        return changed
+
+    def close(self):
+        pass
+
+
+class CorpusWatcher:
+    """Calls on_change(all PDFs in the directory) after each settled burst of changes.
+
+    on_change runs on the watcher's thread, one call at a time; changes arriving while it
+    runs are collected and trigger the next call.
+    """
+
+    def __init__(self, directory: Path, on_change: Callable[[List[Path]], None],
+                 debounce: float = 2.0, poll_interval: float = 1.0, use_inotify: bool = True):
+        self.directory = Path(directory)
+        self.on_change = on_change
+        self.debounce = debounce
+        self.source = None
+        if use_inotify:
+            try:
+                self.source = InotifySource(self.directory)
+            except (OSError, AttributeError) as e:
+                # No inotify on this platform or filesystem; fall back to scanning
+                print(f"inotify unavailable ({str(e)}), polling {self.directory} instead")
+        if self.source is None:
+            self.source = PollingSource(self.directory, poll_interval)
+        # name -> (time of the last event, size and mtime at the last check)
+        self._pending: Dict[str, Tuple[float, Optional[Tuple[int, int]]]] = {}
+
+    def pdf_files(self) -> List[Path]:
+        return sorted(p for p in self.directory.glob("*") if _is_pdf(p.name))
+
+    def run(self, stop: Optional[threading.Event] = None, initial_sync: bool = True):
+        """Watch until stop is set; with initial_sync the current directory is ingested first"""
+        stop = stop or threading.Event()
+        if initial_sync:
+            self._dispatch()
+        try:
+            while not stop.is_set():
+                now = time.monotonic()
+                for name in self.source.wait(self._wait_timeout(now)):
+                    if name == RESCAN:
+                        for path in self.pdf_files():
+                            self._pending[path.name] = (now, None)
+                    else:
+                        self._pending[name] = (time.monotonic(), None)
+                if self._settled(time.monotonic()):
+                    self._dispatch()
+        finally:
+            self.source.close()
+
+    def _wait_timeout(self, now: float) -> float:
+        if not self._pending:
+            return 1.0
+        oldest = min(last for last, _ in self._pending.values())
+        return max(0.05, min(1.0, oldest + self.debounce - now))
+
+    def _settled(self, now: float) -> bool:
+        """True once every pending file is quiet for `debounce` seconds and stopped growing"""
+        if not self._pending:
+            return False
+        settled = True
+        for name, (last_event, last_sig) in list(self._pending.items()):
+            if now - last_event < self.debounce:
+                settled = False
+                continue
+            try:
+                stat = (self.directory / name).stat()
+                sig = (stat.st_size, stat.st_mtime_ns)
+            except FileNotFoundError:
+                sig = None  # Deleted files settle at once
+            if sig is not None and sig != last_sig:
+                # Still changing without events (e.g. a network copy); look again later
+                self._pending[name] = (now, sig)
+                settled = False
+        return settled
+
+    def _dispatch(self):
+        self._pending.clear()
+        try:
+            self.on_change(self.pdf_files())
+        except Exception as e:
+            # Keep watching; the files are picked up again with the next change
+            print(f"Error ingesting {self.directory}: {str(e)}")
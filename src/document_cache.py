@@ -0,0 +1,124 @@
+"""
+Persistent store of parsed documents so unchanged PDFs are never re-parsed
+"""
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable, Union
+
+from .uploads import UploadedPDF
+
+_HASH_CHUNK = 1 << 20
+# Bump whenever DocumentParser output changes so older records are parsed again
+PARSE_FORMAT = 2
+
+
+def file_sha256(path: Path) -> str:
+    """Hash a file's content without reading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DocumentCache:
+    """Parsed structure and sections per PDF content hash, kept in a JSON-lines file.
+
+    A side index of (size, mtime) per path lets unchanged files skip re-hashing; any
+    change to a file yields a new hash and therefore a fresh entry. Byte-identical
+    copies of a document share one entry.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.records_path = self.cache_dir / "documents.jsonl"
+        self.index_path = self.cache_dir / "files.json"
+        self._lock = threading.Lock()
+        self._records: Dict[str, Dict[str, Any]] = self._load_records()
+        self._index: Dict[str, Dict[str, Any]] = self._load_index()
+
+    def _load_records(self) -> Dict[str, Dict[str, Any]]:
+        records = {}
+        if self.records_path.exists():
+            with open(self.records_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from an interrupted run; later lines win anyway
+                        continue
+                    records[record["sha256"]] = record
+        return records
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, json.JSONDecodeError):
+                pass
+        return {}
+
+    def fingerprint(self, pdf_path: Union[Path, UploadedPDF]) -> str:
+        """Content hash of a file, reusing the stored hash while size and mtime are unchanged"""
+        if isinstance(pdf_path, UploadedPDF):
+            # Hashed while it was received; uploads are not tracked by path
+            return pdf_path.sha256()
+        stat = pdf_path.stat()
+        key = str(pdf_path.resolve())
+        with self._lock:
+            known = self._index.get(key)
+            if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+                return known["sha256"]
+
+        digest = file_sha256(pdf_path)
+        with self._lock:
+            self._index[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+            self._save_index()
+        return digest
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        """Cached {"structure", "sections"} for a content hash, if present"""
+        with self._lock:
+            record = self._records.get(digest)
+        if record is None or record.get("format", 1) != PARSE_FORMAT:
+            return None
+        return record
+
+    def lookup(self, pdf_path: Union[Path, UploadedPDF]) -> Optional[Dict[str, Any]]:
+        """Cached entry for a file on disk, if its current content has been parsed before"""
+        return self.get(self.fingerprint(pdf_path))
+
+    def put(self, digest: str, structure: Dict[str, Any], sections: List[Dict[str, Any]]):
+        """Record the parse result for a content hash"""
+        record = {"sha256": digest, "format": PARSE_FORMAT, "structure": structure, "sections": sections}
+        with self._lock:
+            self._records[digest] = record
+            with open(self.records_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def prune(self, live_digests: Iterable[str]):
+        """Drop entries for content no longer present and compact the records file"""
+        live = set(live_digests)
+        with self._lock:
+            self._records = {d: r for d, r in self._records.items() if d in live}
+            self._index = {p: e for p, e in self._index.items() if e["sha256"] in live}
+            tmp_path = self.records_path.with_suffix(".jsonl.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in self._records.values():
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            tmp_path.replace(self.records_path)
+            self._save_index()
+
+    def _save_index(self):
+        tmp_path = self.index_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        tmp_path.replace(self.index_path)
@@ -0,0 +1,86 @@
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple, Iterator, Sequence
+from pathlib import Path
+from .pdf_processor import PDFProcessor
+from .structure_extractor import StructureExtractor
+from .section_segmenter import segment_sections
+from . import instrumentation
+
+ParsedDocument = Tuple[Dict[str, Any], List[Dict[str, Any]]]
+
+
+class DocumentParser:
+    """Turns a PDF into its structure and body-enriched sections (no ML dependencies)"""
+
+    def __init__(self, page_workers: int = 1):
+        self.processor = PDFProcessor()
+        self.extractor = StructureExtractor()
+        self.page_workers = page_workers
+
+    def parse(self, pdf: Path) -> Optional[ParsedDocument]:
+        with instrumentation.document(pdf.name):
+            if not self.processor.load_pdf(pdf, page_workers=self.page_workers):
+                return None
+            snapshot = self.processor.snapshot
+            structure = self.extractor.extract_structure(pdf, snapshot=snapshot)
+            # Headings and their bodies come out of one pass over the spans, in reading order
+            sections = [{
+                "section_title": sec["text"],
+                "page": sec["page"],
+                "combined": f"{sec['text']} {sec['content']}".strip()
+            } for sec in segment_sections(snapshot)]
+            self.processor.close()
+            return structure, sections
+
+    def close(self):
+        """Stop the page shard processes of this parser"""
+        self.processor.shutdown()
+
+
+# Each pool process owns one parser, and with it its own PyMuPDF handle
+_worker_parser: Optional[DocumentParser] = None
+
+
+def _init_worker():
+    global _worker_parser
+    # Document-level workers parse pages serially; pools are not nested
+    _worker_parser = DocumentParser()
+
+
+def parse_in_pool(pdf: Path) -> Optional[ParsedDocument]:
+    """Parse one PDF inside a worker of create_parser_pool()"""
+    return _worker_parser.parse(pdf)
+
+
+def create_parser_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool whose workers each own a DocumentParser"""
+    # spawn keeps workers free of whatever the parent (e.g. torch) already initialised
+    context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker)
+
+
+def iter_parsed_documents(pdf_files: Sequence[Path], workers: int = 1,
+                          parser: Optional[DocumentParser] = None) -> Iterator[Tuple[Path, Optional[ParsedDocument]]]:
+    """Yield (pdf, parse result) in input order, parsing across `workers` processes when > 1"""
+    if workers <= 1 or len(pdf_files) <= 1:
+        parser = parser or DocumentParser()
+        for pdf in pdf_files:
+            yield pdf, parser.parse(pdf)
+        return
+
+    with create_parser_pool(min(workers, len(pdf_files))) as executor:
+        # Keep only a few documents in flight so unconsumed results never pile up
+        remaining = iter(pdf_files)
+        in_flight = deque()
+        for pdf in remaining:
+            in_flight.append((pdf, executor.submit(parse_in_pool, pdf)))
+            if len(in_flight) >= workers * 2:
+                break
+        while in_flight:
+            pdf, future = in_flight.popleft()
+            next_pdf = next(remaining, None)
+            if next_pdf is not None:
+                in_flight.append((next_pdf, executor.submit(parse_in_pool, next_pdf)))
+            yield pdf, future.result()
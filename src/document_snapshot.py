@@ -0,0 +1,76 @@
+"""
+Per-document page cache filled in a single pass over the PDF
+"""
+
+import fitz  # PyMuPDF
+from typing import Dict, Any, List, Optional, Iterable, Sequence, Tuple
+from .span_store import FontTable, PageSpans
+from .heading_classifier import classify_headings
+from . import instrumentation
+
+
+class DocumentSnapshot:
+    """Spans and plain text of every page, extracted once and shared by all readers"""
+
+    def __init__(self, page_count: int, metadata: Optional[Dict[str, Any]] = None):
+        self.page_count = page_count
+        self.metadata = metadata or {}
+        self.fonts = FontTable()
+        self._spans: Dict[int, PageSpans] = {}
+        self._text: Dict[int, str] = {}
+        self._headings: Dict[int, List[Tuple[int, str]]] = {}
+
+    @classmethod
+    def from_document(cls, doc, pages: Optional[range] = None) -> "DocumentSnapshot":
+        """Build a snapshot from an open PyMuPDF document, touching each page once.
+
+        With `pages` only that range is extracted, e.g. for one shard of a large file.
+        """
+        snapshot = cls(len(doc), dict(doc.metadata or {}))
+        with instrumentation.timed("text_extraction") as timer:
+            for page_num in (pages if pages is not None else range(snapshot.page_count)):
+                page = doc[page_num]
+                # One MuPDF layout pass per page; both views are serialised from it. The text
+                # flags match what get_text() uses by default (the dict default only adds images)
+                textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+                text = page.get_text("text", textpage=textpage)
+                snapshot.add_page(
+                    page_num,
+                    PageSpans.from_text_dict(page.get_text("dict", textpage=textpage), page_num, snapshot.fonts),
+                    text
+                )
+                if timer.active:
+                    timer.add_bytes(len(text.encode("utf-8")))
+        return snapshot
+
+    @classmethod
+    def merge(cls, parts: Iterable["DocumentSnapshot"]) -> "DocumentSnapshot":
+        """Combine snapshots of disjoint page ranges of the same document"""
+        parts = list(parts)
+        merged = cls(parts[0].page_count, parts[0].metadata)
+        for part in parts:
+            merged._spans.update(part._spans)
+            merged._text.update(part._text)
+            merged._headings.update(part._headings)
+        return merged
+
+    def add_page(self, page_num: int, spans: PageSpans, text: str):
+        """Store the extracted spans and plain text of a page"""
+        self._spans[page_num] = spans
+        self._text[page_num] = text
+
+    def spans(self, page_num: int) -> Sequence[Dict[str, Any]]:
+        """Formatted spans of a page, as a compact PageSpans sequence of span dicts"""
+        return self._spans.get(page_num, [])
+
+    def text(self, page_num: int) -> str:
+        """Plain text of a page"""
+        return self._text.get(page_num, "")
+
+    def headings(self, page_num: int) -> List[Tuple[int, str]]:
+        """(span index, level) of the heading spans of a page, classified once per page"""
+        headings = self._headings.get(page_num)
+        if headings is None:
+            headings = self._headings[page_num] = classify_headings(self.spans(page_num))
+        return headings
+
@@ -0,0 +1,249 @@
+"""
+Pluggable embedding backends for section and query vectors.
+
+"torch" is the reference fp32 SentenceTransformer, "torch-int8" the same model with
+dynamically quantized Linear layers, and "onnx" runs an exported MiniLM from a local
+directory through ONNX Runtime. Select one with the "embedding" block of the persona
+config, e.g. {"embedding": {"backend": "onnx", "model_path": "models/minilm-onnx"}}.
+"""
+
+import abc
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence, Union
+
+import numpy as np
+
+from . import model_registry
+from .model_registry import DEFAULT_MODEL_NAME
+
+# paraphrase-MiniLM-L6-v2 truncates inputs at 128 word pieces
+DEFAULT_MAX_SEQ_LENGTH = 128
+
+
+class EmbeddingBackend(abc.ABC):
+    """Turns texts into float32 vectors; a single string yields a 1-D vector"""
+
+    name = "base"
+
+    @property
+    @abc.abstractmethod
+    def cache_id(self) -> str:
+        """Identifies the vectors this backend produces, for use in embedding cache keys"""
+
+    def encode(self, texts: Union[str, Sequence[str]], batch_size: int = 32) -> np.ndarray:
+        if isinstance(texts, str):
+            return self._encode_batch([texts], batch_size)[0]
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._encode_batch(list(texts), batch_size)
+
+    @abc.abstractmethod
+    def _encode_batch(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """Vectors of a non-empty list of texts, one row each"""
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """fp32 PyTorch model, or its dynamic int8 quantization when quantize=True"""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, quantize: bool = False):
+        self.model_name = model_name
+        self.quantize = quantize
+        self.name = "torch-int8" if quantize else "torch"
+        self.model = model_registry.get_model(model_name, quantize=quantize)
+
+    @property
+    def cache_id(self) -> str:
+        # fp32 keeps the bare model id so existing cache entries stay valid
+        return f"{self.model_name}:int8" if self.quantize else self.model_name
+
+    def _encode_batch(self, texts: List[str], batch_size: int) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, batch_size=batch_size), dtype=np.float32)
+
+
+class OnnxBackend(EmbeddingBackend):
+    """Exported MiniLM under ONNX Runtime, mean-pooled like the SentenceTransformer"""
+
+    name = "onnx"
+
+    def __init__(self, model_path: Path, quantized: bool = False,
+                 max_seq_length: int = DEFAULT_MAX_SEQ_LENGTH, intra_op_threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_path = Path(model_path)
+        self.quantized = quantized
+        self.max_seq_length = max_seq_length
+        onnx_file = self.model_path / ("model_int8.onnx" if quantized else "model.onnx")
+        if not onnx_file.exists():
+            raise FileNotFoundError(f"ONNX model not found: {onnx_file} (export it with "
+                                    f"python -m src.embedding_backends export {self.model_path})")
+
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_path))
+        options = ort.SessionOptions()
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(str(onnx_file), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    @property
+    def cache_id(self) -> str:
+        return f"onnx:{self.model_path.name}:{'int8' if self.quantized else 'fp32'}"
+
+    def _encode_batch(self, texts: List[str], batch_size: int) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np"
+            )
+            feeds = {k: v.astype(np.int64) for k, v in encoded.items() if k in self.input_names}
+            token_embeds = self.session.run(None, feeds)[0]
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeds * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            vectors.append(pooled.astype(np.float32))
+        return np.concatenate(vectors)
+
+
+_backends: Dict[tuple, EmbeddingBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def create_backend(config: Optional[Dict[str, Any]] = None) -> EmbeddingBackend:
+    """Backend described by an "embedding" config block; instances are shared per process"""
+    config = config or {}
+    backend = config.get("backend", "torch")
+    model_name = config.get("model_name", DEFAULT_MODEL_NAME)
+    model_path = config.get("model_path", "")
+    quantized = bool(config.get("quantized", False))
+    key = (backend, model_name, model_path, quantized)
+
+    with _backends_lock:
+        if key not in _backends:
+            if backend == "torch":
+                _backends[key] = SentenceTransformerBackend(model_name)
+            elif backend == "torch-int8":
+                _backends[key] = SentenceTransformerBackend(model_name, quantize=True)
+            elif backend == "onnx":
+                if not model_path:
+                    raise ValueError("The onnx embedding backend requires a model_path")
+                _backends[key] = OnnxBackend(Path(model_path), quantized=quantized,
+                                             intra_op_threads=int(config.get("intra_op_threads", 0)))
+            else:
+                raise ValueError(f"Unknown embedding backend: {backend}")
+        return _backends[key]
+
+
+def cosine_similarities(query: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Cosine similarity of one query vector against every row of matrix"""
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    norms = np.clip(np.linalg.norm(matrix, axis=1), 1e-12, None)
+    return (matrix @ query) / norms
+
+
+def cosine_similarity_matrix(queries: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Cosine similarity of every query (rows) against every row of matrix, as one product"""
+    queries = queries / np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+    norms = np.clip(np.linalg.norm(matrix, axis=1), 1e-12, None)
+    return (queries @ matrix.T) / norms
+
+
+def check_parity(reference: EmbeddingBackend, candidate: EmbeddingBackend, query: str,
+                 texts: Sequence[str], top_k: int = 5, tolerance: float = 0.02) -> Dict[str, Any]:
+    """Compare a candidate backend's ranking of texts for query against the reference backend"""
+    ref_scores = cosine_similarities(reference.encode(query), reference.encode(texts))
+    cand_scores = cosine_similarities(candidate.encode(query), candidate.encode(texts))
+    ref_top = list(np.argsort(-ref_scores, kind="stable")[:top_k])
+    cand_top = list(np.argsort(-cand_scores, kind="stable")[:top_k])
+    max_diff = float(np.max(np.abs(ref_scores - cand_scores))) if len(texts) else 0.0
+    overlap = len(set(ref_top) & set(cand_top)) / max(len(ref_top), 1)
+    return {
+        "reference": reference.cache_id,
+        "candidate": candidate.cache_id,
+        "sections": len(texts),
+        "top_k_overlap": overlap,
+        "same_top_k_order": ref_top == cand_top,
+        "max_score_diff": max_diff,
+        "within_tolerance": max_diff <= tolerance and overlap == 1.0
+    }
+
+
+def export_onnx(model_name: str, output_dir: Path, quantize: bool = True,
+                max_seq_length: int = DEFAULT_MAX_SEQ_LENGTH):
+    """Export the transformer of a SentenceTransformer to ONNX (plus an int8 copy) with its tokenizer"""
+    import torch
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    model = model_registry.get_model(model_name)
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    tokenizer.save_pretrained(str(output_dir))
+
+    sample = tokenizer(["export sample"], padding="max_length", max_length=max_seq_length,
+                       truncation=True, return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    dynamic_axes = {n: {0: "batch", 1: "sequence"} for n in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer, tuple(sample[n] for n in input_names), str(output_dir / "model.onnx"),
+            input_names=input_names, output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes, opset_version=14
+        )
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(str(output_dir / "model.onnx"), str(output_dir / "model_int8.onnx"),
+                         weight_type=QuantType.QInt8)
+
+
+def _parity_command(args):
+    from .document_parser import iter_parsed_documents
+    from .utils import load_json_safely
+
+    input_dir = Path(args.input_dir)
+    config = load_json_safely(input_dir / "persona_config.json") or {}
+    query = f"{config.get('persona', '')}. {config.get('job_to_be_done', '')}"
+    texts = []
+    for _, parsed in iter_parsed_documents(sorted(input_dir.glob("*.pdf"))):
+        if parsed:
+            texts.extend(sec["combined"] for sec in parsed[1])
+
+    reference = create_backend({"backend": "torch"})
+    candidate = create_backend({
+        "backend": args.backend, "model_path": args.model_path, "quantized": args.quantized
+    })
+    report = check_parity(reference, candidate, query, texts, args.top_k, args.tolerance)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    return 0 if report["within_tolerance"] else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding backend tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="export the MiniLM model to ONNX (fp32 and int8)")
+    export.add_argument("output_dir")
+    export.add_argument("--model-name", default=DEFAULT_MODEL_NAME)
+    export.add_argument("--no-quantize", action="store_true")
+
+    parity = subparsers.add_parser("parity", help="compare a backend's rankings with the fp32 torch backend")
+    parity.add_argument("--backend", choices=["torch-int8", "onnx"], required=True)
+    parity.add_argument("--model-path", default="")
+    parity.add_argument("--quantized", action="store_true", help="use the int8 ONNX model")
+    parity.add_argument("--input-dir", default="input")
+    parity.add_argument("--top-k", type=int, default=5)
+    parity.add_argument("--tolerance", type=float, default=0.02)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_onnx(args.model_name, Path(args.output_dir), quantize=not args.no_quantize)
+        return 0
+    return _parity_command(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
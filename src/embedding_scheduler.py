@@ -0,0 +1,254 @@
+"""
+Shared embedding inference for concurrent requests.
+
+Callers on any thread submit texts and get a future back. One inference thread owns
+the model. Pending texts are grouped by length into buckets, so a batch pads to
+similar lengths whichever requests its texts came from; a bucket is encoded as soon as
+it holds max_batch_size texts, or once its oldest text has waited max_wait. Requests
+thereby share encode calls instead of contending for the model.
+
+Queue depth, batch size and wait time at each dispatch are recorded as histograms and
+exported by instrumentation.prometheus_text().
+"""
+
+import bisect
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import instrumentation
+from .embedding_backends import EmbeddingBackend
+
+# Upper bounds (in characters) of the length buckets; longer texts share the last one.
+# MiniLM truncates at 128 word pieces, roughly 500 characters of English.
+DEFAULT_LENGTH_BUCKETS = (32, 64, 128, 256, 512)
+
+_queue_depth = instrumentation.histogram(
+    "pdf_intel_embedding_queue_depth", "Texts waiting for the embedding model when a batch is dispatched",
+    (1, 8, 16, 32, 64, 128, 256, 512, 1024, 4096))
+_batch_size = instrumentation.histogram(
+    "pdf_intel_embedding_batch_size", "Texts per batch run by the embedding model",
+    (1, 2, 4, 8, 16, 32, 64, 128, 256))
+_wait_seconds = instrumentation.histogram(
+    "pdf_intel_embedding_wait_seconds", "Time the oldest text of a batch waited before it ran",
+    (0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on, which in a container can be fewer than os.cpu_count()"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class _Request:
+    """The texts of one submit() call; its future resolves once every text is encoded"""
+
+    __slots__ = ("texts", "future", "vectors", "remaining", "submitted")
+
+    def __init__(self, texts: List[str], future: Future):
+        self.texts = texts
+        self.future = future
+        self.vectors: Optional[np.ndarray] = None
+        self.remaining = len(texts)
+        self.submitted = time.monotonic()
+
+
+# One text of a request, by position
+_Item = Tuple[_Request, int]
+
+
+class EmbeddingScheduler(EmbeddingBackend):
+    """Micro-batches encode calls from many threads onto one inference thread.
+
+    It is an EmbeddingBackend itself, so a PersonaAnalyzer given the scheduler as its
+    backend blocks on the shared batches without any other change. intra_op_threads
+    sizes torch's intra-op pool for the inference thread; 0 uses every available CPU.
+    """
+
+    def __init__(self, backend: EmbeddingBackend, max_batch_size: int = 64, max_wait: float = 0.005,
+                 length_buckets: Sequence[int] = DEFAULT_LENGTH_BUCKETS, intra_op_threads: int = 0):
+        self.backend = backend
+        self.name = f"batched-{backend.name}"
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.length_buckets = tuple(sorted(length_buckets))
+        self.intra_op_threads = intra_op_threads or available_cpus()
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        # Owned by the inference thread
+        self._buckets: List[Deque[_Item]] = [deque() for _ in range(len(self.length_buckets) + 1)]
+        self._pending = 0
+        self._closed = False
+        # Orders submit() against close(), so nothing is queued behind the stop marker
+        self._submit_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="embedding-inference", daemon=True)
+        self._thread.start()
+
+    @property
+    def cache_id(self) -> str:
+        return self.backend.cache_id
+
+    def submit(self, texts: Sequence[str]) -> "Future[np.ndarray]":
+        """Queue texts for encoding; the future yields their vectors in input order.
+
+        Raises RuntimeError once the scheduler is closed.
+        """
+        future: Future = Future()
+        texts = list(texts)
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError("EmbeddingScheduler is closed")
+            if not texts:
+                future.set_result(np.zeros((0, 0), dtype=np.float32))
+                return future
+            self._queue.put(_Request(texts, future))
+        return future
+
+    def _encode_batch(self, texts: List[str], batch_size: int) -> np.ndarray:
+        return self.submit(texts).result()
+
+    def close(self):
+        """Finish the queued work and stop the inference thread"""
+        with self._submit_lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(None)
+        self._thread.join()
+
+    def _pin_threads(self):
+        # torch sizes its pool by physical cores, ignoring CPU affinity and cgroup limits;
+        # with every encode on this one thread, one pool of the available CPUs is enough
+        if self.backend.name.startswith("torch"):
+            import torch
+            torch.set_num_threads(self.intra_op_threads)
+
+    def _run(self):
+        try:
+            self._pin_threads()
+        except Exception as e:
+            print(f"Could not set embedding threads: {str(e)}")
+        closing = False
+        while True:
+            batch: List[_Item] = []
+            try:
+                closing = self._receive(closing) or closing
+                if closing and not self._pending:
+                    return
+                batch = self._next_batch(time.monotonic(), flush=closing)
+                if batch:
+                    self._encode_items(batch)
+            except Exception as e:
+                # Callers block on their futures without a timeout: fail everything in
+                # flight instead of leaving it unanswered, and keep serving
+                self._fail_outstanding(batch, e)
+
+    def _fail_outstanding(self, batch: List[_Item], error: Exception):
+        items = list(batch)
+        for bucket in self._buckets:
+            items.extend(bucket)
+            bucket.clear()
+        self._pending = 0
+        for request, _ in items:
+            if not request.future.done():
+                request.future.set_exception(error)
+
+    def _receive(self, closing: bool) -> bool:
+        """Move newly submitted requests into the buckets; True once close() was called"""
+        if closing:
+            return True
+        deadline = self._next_deadline()
+        try:
+            if deadline is None:
+                request = self._queue.get()
+            else:
+                request = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            while True:
+                if request is None:
+                    return True
+                for index, text in enumerate(request.texts):
+                    self._buckets[bisect.bisect_left(self.length_buckets, len(text))].append((request, index))
+                self._pending += len(request.texts)
+                request = self._queue.get_nowait()
+        except queue.Empty:
+            return False
+
+    def _next_deadline(self) -> Optional[float]:
+        heads = [bucket[0][0].submitted for bucket in self._buckets if bucket]
+        return min(heads) + self.max_wait if heads else None
+
+    def _next_batch(self, now: float, flush: bool) -> List[_Item]:
+        """Texts of the fullest full bucket, else of the bucket whose head is overdue"""
+        chosen = None
+        for bucket in self._buckets:
+            if len(bucket) >= self.max_batch_size and (chosen is None or len(bucket) > len(chosen)):
+                chosen = bucket
+        if chosen is None:
+            overdue = [bucket for bucket in self._buckets
+                       if bucket and (flush or bucket[0][0].submitted + self.max_wait <= now)]
+            if not overdue:
+                return []
+            chosen = min(overdue, key=lambda bucket: bucket[0][0].submitted)
+
+        depth = self._pending
+        waited = now - chosen[0][0].submitted
+        batch = []
+        while chosen and len(batch) < self.max_batch_size:
+            item = chosen.popleft()
+            self._pending -= 1
+            # Texts of a request that already failed are dropped
+            if not item[0].future.done():
+                batch.append(item)
+        if batch:
+            _queue_depth.observe(depth)
+            _wait_seconds.observe(waited)
+        return batch
+
+    def _encode_items(self, batch: List[_Item]):
+        _batch_size.observe(len(batch))
+        texts = [request.texts[index] for request, index in batch]
+        try:
+            vectors = self._encode(texts)
+        except Exception:
+            self._encode_per_request(batch)
+            return
+        self._deliver(batch, vectors)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self.backend.encode(texts, batch_size=len(texts))
+        if len(vectors) != len(texts):
+            raise ValueError(f"{self.backend.name} returned {len(vectors)} vectors for {len(texts)} texts")
+        return vectors
+
+    def _encode_per_request(self, batch: List[_Item]):
+        """Retry a failed batch one request at a time, so only the requests whose own
+        texts fail get the error"""
+        by_request: Dict[int, List[_Item]] = {}
+        for item in batch:
+            by_request.setdefault(id(item[0]), []).append(item)
+        for items in by_request.values():
+            request = items[0][0]
+            texts = [request.texts[index] for _, index in items]
+            try:
+                vectors = self._encode(texts)
+            except Exception as e:
+                request.future.set_exception(e)
+                continue
+            self._deliver(items, vectors)
+
+    def _deliver(self, batch: List[_Item], vectors: np.ndarray):
+        for (request, index), vector in zip(batch, vectors):
+            if request.future.done():
+                continue
+            if request.vectors is None:
+                request.vectors = np.empty((len(request.texts), vectors.shape[1]), dtype=np.float32)
+            request.vectors[index] = vector
+            request.remaining -= 1
+            if request.remaining == 0:
+                request.future.set_result(request.vectors)
@@ -0,0 +1,102 @@
+"""
+Vectorised heading and title classification over a page's spans
+"""
+
+import re
+from typing import List, Dict, Any, Tuple, Sequence
+
+import numpy as np
+
+from .span_store import PageSpans
+from .instrumentation import timed_function
+
+BOLD_FLAG = 2**4
+
+# Any of these makes a span of acceptable length a heading candidate
+HEADING_PATTERN = re.compile(
+    r'^(?:\d+\.?\s+[A-Z]'                    # Numbered headings
+    r'|[A-Z][A-Z\s]+$'                       # ALL CAPS
+    r'|[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*$'      # Title Case
+    r'|\d+\.\d+\.?\s+)'                      # Numbered subsections
+)
+
+# Numbering that fixes the level; alternatives are tried in order, like the original if/elif
+NUMBERING_PATTERN = re.compile(r'^(?:(?P<H1>\d+\.?\s+)|(?P<H2>\d+\.\d+\.?\s+)|(?P<H3>\d+\.\d+\.\d+\.?\s+))')
+
+# Stricter numbering used by the outline refinement in StructureExtractor
+OUTLINE_NUMBERING_PATTERN = re.compile(r'^(?:(?P<H1>\d+\s)|(?P<H2>\d+\.\d+\s)|(?P<H3>\d+\.\d+\.\d+\s))')
+
+
+class SpanColumns:
+    """Struct-of-arrays view of a page's spans for mask-based rules"""
+
+    def __init__(self, spans: Sequence[Dict[str, Any]]):
+        if isinstance(spans, PageSpans):
+            self._from_page_spans(spans)
+            return
+        count = len(spans)
+        self.texts = [s["text"].strip() for s in spans]
+        self.size = np.fromiter((s.get("size", 0) for s in spans), dtype=np.float64, count=count)
+        self.flags = np.fromiter((s.get("flags", 0) for s in spans), dtype=np.int64, count=count)
+        self.y0 = np.fromiter((s.get("bbox", [0, 0, 0, 0])[1] for s in spans), dtype=np.float64, count=count)
+        self.text_len = np.fromiter((len(t) for t in self.texts), dtype=np.int64, count=count)
+        self.raw_len = np.fromiter((len(s["text"]) for s in spans), dtype=np.int64, count=count)
+
+    def _from_page_spans(self, spans: PageSpans):
+        # Columns are read straight from the span store's arrays; no per-span dicts
+        raw_texts = spans.texts()
+        self.texts = [t.strip() for t in raw_texts]
+        self.size = np.frombuffer(spans.sizes, dtype=np.float32).astype(np.float64)
+        self.flags = np.frombuffer(spans.flags, dtype=np.int32).astype(np.int64)
+        self.y0 = np.frombuffer(spans.bboxes, dtype=np.float32)[1::4].astype(np.float64)
+        self.text_len = np.fromiter((len(t) for t in self.texts), dtype=np.int64, count=len(self.texts))
+        self.raw_len = np.fromiter((len(t) for t in raw_texts), dtype=np.int64, count=len(raw_texts))
+
+
+@timed_function("heading_detection")
+def classify_headings(spans: Sequence[Dict[str, Any]]) -> List[Tuple[int, str]]:
+    """(span index, level) of every span that looks like a heading, in span order"""
+    if not spans:
+        return []
+    cols = SpanColumns(spans)
+
+    length_ok = (cols.text_len >= 3) & (cols.text_len <= 150)
+    by_format = (cols.size > 12) | ((cols.flags & BOLD_FLAG) != 0)
+    is_heading = length_ok & by_format
+    # The regex only decides spans the font rules have not already accepted
+    for i in np.flatnonzero(length_ok & ~by_format):
+        if HEADING_PATTERN.match(cols.texts[i]):
+            is_heading[i] = True
+
+    font_levels = np.where(cols.size >= 16, "H1", np.where(cols.size >= 14, "H2", "H3"))
+    headings = []
+    for i in np.flatnonzero(is_heading):
+        match = NUMBERING_PATTERN.match(cols.texts[i])
+        headings.append((int(i), match.lastgroup if match else str(font_levels[i])))
+    return headings
+
+
+def title_scores(cols: SpanColumns, page_num: int) -> np.ndarray:
+    """Title score of every span from font size, boldness, position and length"""
+    scores = np.select([cols.size > 16, cols.size > 14, cols.size > 12], [2.0, 1.5, 1.0], default=0.0)
+    scores += np.where((cols.flags & BOLD_FLAG) != 0, 1.0, 0.0)
+    scores += np.where(cols.y0 < 200, 1.0, 0.0)  # Top of page
+    if page_num == 0:
+        scores += 0.5
+    scores -= np.where(cols.raw_len > 100, 0.5, 0.0)
+    return scores
+
+
+def title_candidates(spans: Sequence[Dict[str, Any]], page_num: int) -> List[Tuple[str, float, int]]:
+    """(text, score, page) of spans of reasonable title length that score above zero"""
+    if not spans:
+        return []
+    cols = SpanColumns(spans)
+    scores = title_scores(cols, page_num)
+    keep = (cols.text_len > 5) & (cols.text_len < 200) & (scores > 0)
+    return [(cols.texts[i], float(scores[i]), page_num) for i in np.flatnonzero(keep)]
+
+
+def outline_numbering_level(text: str) -> str:
+    match = OUTLINE_NUMBERING_PATTERN.match(text)
+    return match.lastgroup if match else ""
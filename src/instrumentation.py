@@ -0,0 +1,273 @@
+"""
+Lightweight per-stage timers and counters.
+
+    with instrumentation.timed("embedding") as timer:
+        ...
+        if timer.active:
+            timer.add_bytes(size)
+
+Every stage accumulates wall time, call count and bytes processed in a process-wide
+registry. collect() additionally gathers the stages of one run (e.g. one request) in
+the current thread. While disabled, timed() hands out a shared no-op timer, so an
+instrumented call costs one flag check.
+
+A stage listener (the profiler) is told about every stage entered and left, even when
+timings are disabled; document() tags the stages of one PDF with its name.
+
+histogram() registers a distribution (e.g. embedding batch sizes) that is exported next
+to the stage counters; like the timings it only records while enabled.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Any, Iterator, Optional, Sequence
+
+# Prefix of the exported Prometheus metric names
+METRIC_PREFIX = "pdf_intel_stage"
+
+_enabled = False
+# True while timings are enabled or a listener is set; the only check on the hot path
+_active = False
+_listener = None
+_lock = threading.Lock()
+
+
+class StageStats:
+    """Wall time, calls and bytes per stage name"""
+
+    def __init__(self):
+        self.stages: Dict[str, list] = {}
+
+    def record(self, name: str, seconds: float, nbytes: int):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = [0.0, 0, 0]
+        entry[0] += seconds
+        entry[1] += 1
+        entry[2] += nbytes
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {"seconds": round(seconds, 6), "calls": calls, "bytes": nbytes}
+            for name, (seconds, calls, nbytes) in self.stages.items()
+        }
+
+
+class Histogram:
+    """Counts of observed values per upper bound, plus their sum, as Prometheus histograms keep them"""
+
+    def __init__(self, name: str, help_text: str, bounds: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.bounds = tuple(sorted(bounds))
+        self.clear()
+
+    def clear(self):
+        # One slot per bound and a last one for +Inf
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        if not _enabled:
+            return
+        with _lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.total += value
+            self.count += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        with _lock:
+            counts, total, count = list(self.counts), self.total, self.count
+        return {"buckets": dict(zip([*map(str, self.bounds), "+Inf"], counts)),
+                "sum": round(total, 6), "count": count}
+
+    def prometheus_lines(self) -> list:
+        with _lock:
+            counts, total, count = list(self.counts), self.total, self.count
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, n in zip([*map(str, self.bounds), "+Inf"], counts):
+            cumulative += n
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {round(total, 6)}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+
+
+_registry = StageStats()
+_histograms: Dict[str, Histogram] = {}
+_run_stats: contextvars.ContextVar[Optional[StageStats]] = contextvars.ContextVar("run_stats", default=None)
+_document: contextvars.ContextVar[str] = contextvars.ContextVar("document", default="")
+
+
+class _Timer:
+    __slots__ = ("name", "nbytes", "_start")
+    active = True
+
+    def __init__(self, name: str, nbytes: int):
+        self.name = name
+        self.nbytes = nbytes
+
+    def add_bytes(self, nbytes: int):
+        self.nbytes += nbytes
+
+    def __enter__(self):
+        listener = _listener
+        if listener is not None:
+            listener.enter(self.name, _document.get())
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        listener = _listener
+        if listener is not None:
+            listener.exit(self.name, _document.get())
+        if not _enabled:
+            return False
+        run = _run_stats.get()
+        with _lock:
+            _registry.record(self.name, seconds, self.nbytes)
+            if run is not None:
+                run.record(self.name, seconds, self.nbytes)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+    active = False
+
+    def add_bytes(self, nbytes: int):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+def _update_active():
+    global _active
+    _active = _enabled or _listener is not None
+
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+    _update_active()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def set_listener(listener):
+    """Install (or with None remove) an object with enter(stage, document) and exit(stage, document)"""
+    global _listener
+    _listener = listener
+    _update_active()
+
+
+def timed(name: str, nbytes: int = 0):
+    """Context manager timing one call of a stage"""
+    if not _active:
+        return _NOOP
+    return _Timer(name, nbytes)
+
+
+def timed_function(name: str):
+    """Decorator form of timed(); the enabled flag is checked on every call"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _active:
+                return func(*args, **kwargs)
+            with _Timer(name, 0):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def document(name: str) -> Iterator[None]:
+    """Tag the stages run by this thread inside the block with a document name"""
+    token = _document.set(name)
+    listener = _listener
+    if listener is not None:
+        # The listener sees the document scope as a stage without a name
+        listener.enter(None, name)
+    try:
+        yield
+    finally:
+        if listener is not None:
+            listener.exit(None, name)
+        _document.reset(token)
+
+
+@contextmanager
+def collect() -> Iterator[StageStats]:
+    """Gather the stages recorded by this thread inside the block into a fresh StageStats"""
+    stats = StageStats()
+    token = _run_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _run_stats.reset(token)
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """Totals of every stage since start (or the last reset)"""
+    with _lock:
+        return _registry.as_dict()
+
+
+def histogram(name: str, help_text: str, bounds: Sequence[float]) -> Histogram:
+    """The process-wide histogram called name, registered on first use"""
+    with _lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram(name, help_text, bounds)
+        return _histograms[name]
+
+
+def histograms() -> Dict[str, Dict[str, Any]]:
+    with _lock:
+        registered = list(_histograms.values())
+    return {h.name: h.as_dict() for h in registered}
+
+
+def reset():
+    global _registry
+    with _lock:
+        _registry = StageStats()
+        for h in _histograms.values():
+            h.clear()
+
+
+def prometheus_text() -> str:
+    """The registry in Prometheus text exposition format"""
+    stages = snapshot()
+    lines = []
+    for suffix, field, help_text in (
+        ("seconds_total", "seconds", "Wall time spent in each processing stage"),
+        ("calls_total", "calls", "Number of times each processing stage ran"),
+        ("bytes_total", "bytes", "Bytes processed by each processing stage"),
+    ):
+        metric = f"{METRIC_PREFIX}_{suffix}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for name, values in sorted(stages.items()):
+            lines.append(f'{metric}{{stage="{name}"}} {values[field]}')
+    with _lock:
+        registered = sorted(_histograms.values(), key=lambda h: h.name)
+    for h in registered:
+        lines.extend(h.prometheus_lines())
+    return "\n".join(lines) + "\n"
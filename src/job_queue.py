@@ -0,0 +1,113 @@
+"""
+Background job execution with a local SQLite job store
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Optional, Callable
+
+# Progress counters a job may report while it runs
+PROGRESS_FIELDS = ("documents_total", "documents_parsed", "sections_embedded")
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class JobStore:
+    """Persists job status, progress counters and results in a SQLite file"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, mode TEXT, "
+            "documents_total INTEGER DEFAULT 0, documents_parsed INTEGER DEFAULT 0, "
+            "sections_embedded INTEGER DEFAULT 0, result TEXT, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        # Jobs that were in flight when the process died will never finish
+        self._conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'interrupted by restart' "
+            "WHERE status IN ('queued', 'running')"
+        )
+        self._conn.commit()
+
+    def create(self, mode: str, documents_total: int = 0) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, mode, documents_total, created_at, updated_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, mode, documents_total, now, now)
+            )
+            self._conn.commit()
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"], ensure_ascii=False)
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            columns = [c[0] for c in cursor.description]
+        if row is None:
+            return None
+        job = dict(zip(columns, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+class JobQueue:
+    """Bounded in-process worker pool that runs jobs and records them in a JobStore"""
+
+    def __init__(self, store: JobStore, concurrency: int = 2, max_queued: int = 16):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="job")
+        # Running plus waiting jobs never exceed concurrency + max_queued
+        self._slots = threading.BoundedSemaphore(concurrency + max_queued)
+
+    def submit(self, mode: str, func: Callable[..., Any], documents_total: int = 0,
+               cleanup: Optional[Callable[[], None]] = None) -> str:
+        """Queue func(progress, job_id) and return its job id; raises QueueFullError when saturated.
+
+        func receives a progress(field, value) callback and its own job id (e.g. to name its
+        outputs) and returns the job result.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError("Job queue is full, try again later")
+        job_id = self.store.create(mode, documents_total)
+        self._executor.submit(self._run, job_id, func, cleanup)
+        return job_id
+
+    def _run(self, job_id: str, func: Callable[..., Any], cleanup: Optional[Callable[[], None]]):
+        def progress(field: str, value: int):
+            if field in PROGRESS_FIELDS:
+                self.store.update(job_id, **{field: value})
+
+        try:
+            self.store.update(job_id, status="running")
+            result = func(progress, job_id)
+            self.store.update(job_id, status="done", result=result)
+        except Exception as e:
+            self.store.update(job_id, status="failed", error=str(e))
+        finally:
+            if cleanup:
+                cleanup()
+            self._slots.release()
@@ -0,0 +1,67 @@
+"""
+Process-wide registry of embedding models, loaded lazily and shared across threads
+"""
+
+import threading
+import time
+from typing import Dict, Any, Iterable
+
+from .utils import get_rss_bytes
+
+DEFAULT_MODEL_NAME = 'paraphrase-MiniLM-L6-v2'
+
+_models: Dict[str, Any] = {}
+_metrics: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+
+
+def get_model(name: str = DEFAULT_MODEL_NAME, quantize: bool = False):
+    """Return the shared SentenceTransformer for name, loading it on first use.
+
+    quantize=True gives a separate copy with dynamically int8-quantized Linear layers.
+    """
+    key = f"{name}:int8" if quantize else name
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _lock:
+        # Another thread may have finished loading while we waited
+        if key not in _models:
+            _models[key] = _load_model(key, name, quantize)
+        return _models[key]
+
+
+def _load_model(key: str, name: str, quantize: bool):
+    rss_before = get_rss_bytes()
+    start = time.perf_counter()
+    # Imported here so processes that never embed never pay for torch
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(name, device="cpu" if quantize else None)
+    if quantize:
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    load_seconds = time.perf_counter() - start
+    _metrics[key] = {
+        "load_seconds": round(load_seconds, 3),
+        "rss_delta_bytes": max(get_rss_bytes() - rss_before, 0),
+        # Quantized Linear weights are packed buffers, so this counts only what stays fp32
+        "parameter_bytes": sum(p.numel() * p.element_size() for p in model.parameters()),
+        "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+    return model
+
+
+def warm_up(names: Iterable[str] = (DEFAULT_MODEL_NAME,)):
+    """Load models ahead of the first request and run one encode to initialise kernels"""
+    for name in names:
+        get_model(name).encode("warm up")
+
+
+def is_loaded(name: str = DEFAULT_MODEL_NAME) -> bool:
+    return name in _models
+
+
+def model_metrics() -> Dict[str, Dict[str, Any]]:
+    """Load time and memory figures for every model loaded in this process"""
+    with _lock:
+        return {name: dict(metrics) for name, metrics in _metrics.items()}
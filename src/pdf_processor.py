@@ -4,8 +4,55 @@ PDF Processing utilities for extracting text and structure from PDF documents
 
 import fitz  # PyMuPDF
 import re
-from typing import List, Dict, Any, Optional, Tuple
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Optional, Tuple, Sequence, Union, BinaryIO
 from pathlib import Path
+from .document_snapshot import DocumentSnapshot
+from . import instrumentation
+from .uploads import UploadedPDF
+from .heading_classifier import title_candidates
+
+# Anything load_pdf can open: a path, raw bytes, a binary file-like object or an upload
+PDFInput = Union[Path, str, bytes, bytearray, memoryview, BinaryIO, UploadedPDF]
+
+
+def open_pdf(source: PDFInput) -> fitz.Document:
+    """Open a PDF from disk or, for bytes, streams and in-memory uploads, without touching disk"""
+    if isinstance(source, UploadedPDF):
+        source = source.data if source.data is not None else source.path
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype="pdf")
+    if hasattr(source, "read"):
+        return fitz.open(stream=source.read(), filetype="pdf")
+    return fitz.open(source)
+
+
+def source_path(source: PDFInput) -> Optional[Path]:
+    """The file behind a PDF input, if it is on disk"""
+    if isinstance(source, UploadedPDF):
+        return source.path
+    if isinstance(source, (str, Path)):
+        return Path(source)
+    return None
+
+
+def _source_size(source: PDFInput) -> int:
+    if isinstance(source, UploadedPDF):
+        return source.size
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    path = source_path(source)
+    return path.stat().st_size if path is not None else 0
+
+
+def source_name(source: PDFInput) -> str:
+    """File name of a PDF input, or a placeholder for anonymous bytes and streams"""
+    if isinstance(source, (str, Path, UploadedPDF)):
+        return Path(source.name if isinstance(source, UploadedPDF) else source).name
+    return getattr(source, "name", None) or "<memory>"
+
 
 class PDFProcessor:
     """Base class for PDF processing operations"""
@@ -13,73 +60,96 @@ class PDFProcessor:
     def __init__(self):
         self.doc = None
         self.page_count = 0
+        self.snapshot: Optional[DocumentSnapshot] = None
+        # Started with the first sharded document and reused for the next ones
+        self._shard_pool: Optional[ProcessPoolExecutor] = None
+        self._shard_workers = 0
         
-    def load_pdf(self, pdf_path: Path) -> bool:
-        """Load PDF document"""
+    def load_pdf(self, pdf_path: PDFInput, page_workers: int = 1, shard_size: int = 32) -> bool:
+        """Load PDF document and snapshot all of its pages in one pass.
+
+        pdf_path may also be the PDF's bytes, a binary file-like object or an UploadedPDF.
+        With page_workers > 1, documents on disk longer than one shard are split into
+        shard_size page ranges that are extracted in separate processes. Those processes
+        stay up for the next large document until shutdown().
+        """
         try:
-            self.doc = fitz.open(pdf_path)
+            path = source_path(pdf_path)
+            with instrumentation.timed("pdf_open") as timer:
+                self.doc = open_pdf(pdf_path)
+                if timer.active:
+                    timer.add_bytes(_source_size(pdf_path))
             self.page_count = len(self.doc)
+            if page_workers > 1 and self.page_count > shard_size and path is not None:
+                # Every shard opens the file itself; this handle is only needed for the page count
+                self.doc.close()
+                self.doc = None
+                self.snapshot = extract_pages_sharded(path, self.page_count, self._shard_executor(page_workers),
+                                                      shard_size)
+            else:
+                self.snapshot = DocumentSnapshot.from_document(self.doc)
             return True
         except Exception as e:
-            print(f"Error loading PDF {pdf_path}: {str(e)}")
+            print(f"Error loading PDF {source_name(pdf_path)}: {str(e)}")
+            if isinstance(e, BrokenProcessPool):
+                # A shard worker died; start a fresh pool for the next document
+                self.shutdown()
+            self.close()
             return False
+
+    def _shard_executor(self, workers: int) -> ProcessPoolExecutor:
+        if self._shard_pool is None or self._shard_workers != workers:
+            self.shutdown()
+            self._shard_pool = create_shard_pool(workers)
+            self._shard_workers = workers
+        return self._shard_pool
+
+    def shutdown(self):
+        """Stop the page shard processes; later loads start them again when needed"""
+        if self._shard_pool is not None:
+            self._shard_pool.shutdown()
+            self._shard_pool = None
+    
+    def use_snapshot(self, snapshot: DocumentSnapshot):
+        """Serve all extraction calls from an already built snapshot"""
+        self.close()
+        self.snapshot = snapshot
+        self.page_count = snapshot.page_count
     
     def close(self):
         """Close the PDF document"""
         if self.doc:
             self.doc.close()
             self.doc = None
+        self.snapshot = None
     
-    def extract_text_with_formatting(self, page_num: int) -> List[Dict[str, Any]]:
+    def extract_text_with_formatting(self, page_num: int) -> Sequence[Dict[str, Any]]:
         """Extract text with formatting information from a specific page"""
-        if not self.doc or page_num >= self.page_count:
+        if not self.snapshot or page_num >= self.page_count:
             return []
         
-        page = self.doc[page_num]
-        text_dict = page.get_text("dict")
-        
-        blocks = []
-        for block in text_dict.get("blocks", []):
-            if "lines" in block:
-                for line in block["lines"]:
-                    for span in line.get("spans", []):
-                        if span.get("text", "").strip():
-                            blocks.append({
-                                "text": span["text"],
-                                "font": span.get("font", ""),
-                                "size": span.get("size", 0),
-                                "flags": span.get("flags", 0),
-                                "bbox": span.get("bbox", [0, 0, 0, 0]),
-                                "page": page_num
-                            })
-        
-        return blocks
+        return self.snapshot.spans(page_num)
     
     def extract_page_text(self, page_num: int) -> str:
         """Extract plain text from a specific page"""
-        if not self.doc or page_num >= self.page_count:
+        if not self.snapshot or page_num >= self.page_count:
             return ""
         
-        page = self.doc[page_num]
-        return page.get_text()
+        return self.snapshot.text(page_num)
     
     def extract_all_text(self) -> str:
         """Extract all text from the document"""
-        if not self.doc:
+        if not self.snapshot:
             return ""
         
-        full_text = ""
-        for page_num in range(self.page_count):
-            full_text += self.extract_page_text(page_num) + "\n"
-        
-        return full_text
+        return "".join(self.extract_page_text(page_num) + "\n" for page_num in range(self.page_count))
     
     def get_document_info(self) -> Dict[str, Any]:
         """Get document metadata"""
-        if not self.doc:
+        if not self.snapshot:
             return {}
         
-        metadata = self.doc.metadata
+        metadata = self.snapshot.metadata
         return {
             "title": metadata.get("title", ""),
             "author": metadata.get("author", ""),
@@ -93,132 +163,62 @@ class PDFProcessor:
     
     def find_title_candidates(self) -> List[Tuple[str, float, int]]:
         """Find potential document titles based on text analysis"""
-        if not self.doc:
+        if not self.snapshot:
             return []
         
         candidates = []
         
-        # Check first few pages for title candidates
+        # Check first few pages for title candidates, scoring each page's spans at once
         for page_num in range(min(3, self.page_count)):
-            blocks = self.extract_text_with_formatting(page_num)
-            
-            for block in blocks:
-                text = block["text"].strip()
-                if len(text) > 5 and len(text) < 200:  # Reasonable title length
-                    # Score based on font size, position, and formatting
-                    score = self._calculate_title_score(block, page_num)
-                    if score > 0:
-                        candidates.append((text, score, page_num))
+            candidates.extend(title_candidates(self.extract_text_with_formatting(page_num), page_num))
         
         # Sort by score descending
         candidates.sort(key=lambda x: x[1], reverse=True)
         return candidates
     
-    def _calculate_title_score(self, block: Dict[str, Any], page_num: int) -> float:
-        """Calculate title score based on formatting and position"""
-        score = 0.0
-        
-        # Font size contribution
-        size = block.get("size", 0)
-        if size > 16:
-            score += 2.0
-        elif size > 14:
-            score += 1.5
-        elif size > 12:
-            score += 1.0
-        
-        # Bold formatting
-        flags = block.get("flags", 0)
-        if flags & 2**4:  # Bold flag
-            score += 1.0
-        
-        # Position on page (higher = better for title)
-        bbox = block.get("bbox", [0, 0, 0, 0])
-        y_pos = bbox[1]
-        if y_pos < 200:  # Top of page
-            score += 1.0
-        
-        # First page bonus
-        if page_num == 0:
-            score += 0.5
-        
-        # Penalize very long text
-        text_length = len(block["text"])
-        if text_length > 100:
-            score -= 0.5
-        
-        return score
-    
-    def extract_sections_by_formatting(self) -> List[Dict[str, Any]]:
+    def extract_sections_by_formatting(self, pages: Optional[range] = None) -> List[Dict[str, Any]]:
         """Extract sections based on formatting patterns"""
         sections = []
         
-        for page_num in range(self.page_count):
+        for page_num in (pages if pages is not None else range(self.page_count)):
             blocks = self.extract_text_with_formatting(page_num)
+            if not blocks:
+                continue
             
-            for block in blocks:
-                text = block["text"].strip()
-                if self._is_potential_heading(block, text):
-                    level = self._determine_heading_level(block)
-                    sections.append({
-                        "text": text,
-                        "level": level,
-                        "page": page_num + 1,  # 1-based page numbering
-                        "font_size": block.get("size", 0),
-                        "font": block.get("font", "")
-                    })
+            # Classified once per page and shared with the section segmenter
+            for index, level in self.snapshot.headings(page_num):
+                block = blocks[index]
+                sections.append({
+                    "text": block["text"].strip(),
+                    "level": level,
+                    "page": page_num + 1,  # 1-based page numbering
+                    "font_size": block.get("size", 0),
+                    "font": block.get("font", "")
+                })
         
         return sections
-    
-    def _is_potential_heading(self, block: Dict[str, Any], text: str) -> bool:
-        """Determine if a text block is likely a heading"""
-        # Basic filters
-        if len(text) < 3 or len(text) > 150:
-            return False
-        
-        # Check for heading patterns
-        heading_patterns = [
-            r'^\d+\.?\s+[A-Z]',  # Numbered headings
-            r'^[A-Z][A-Z\s]+$',  # ALL CAPS
-            r'^[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*$',  # Title Case
-            r'^\d+\.\d+\.?\s+',  # Numbered subsections
-        ]
-        
-        for pattern in heading_patterns:
-            if re.match(pattern, text):
-                return True
-        
-        # Check formatting
-        size = block.get("size", 0)
-        flags = block.get("flags", 0)
-        
-        # Larger font size
-        if size > 12:
-            return True
-        
-        # Bold formatting
-        if flags & 2**4:
-            return True
-        
-        return False
-    
-    def _determine_heading_level(self, block: Dict[str, Any]) -> str:
-        """Determine heading level based on formatting"""
-        size = block.get("size", 0)
-        text = block["text"].strip()
-        
-        # Check for numbered patterns
-        if re.match(r'^\d+\.?\s+', text):
-            return "H1"
-        elif re.match(r'^\d+\.\d+\.?\s+', text):
-            return "H2"
-        elif re.match(r'^\d+\.\d+\.\d+\.?\s+', text):
-            return "H3"
-        
-        # Font size based classification
-        if size >= 16:
-            return "H1"
-        elif size >= 14:
-            return "H2"
-        else:
-            return "H3"
+
+
+def _extract_shard(pdf_path: str, start: int, end: int) -> DocumentSnapshot:
+    """Snapshot of pages [start, end) with their headings classified, using this process's own handle"""
+    with fitz.open(pdf_path) as doc:
+        snapshot = DocumentSnapshot.from_document(doc, range(start, end))
+    for page_num in range(start, end):
+        snapshot.headings(page_num)
+    return snapshot
+
+
+def create_shard_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool for extract_pages_sharded()"""
+    # spawn keeps workers free of whatever the parent (e.g. torch) already initialised
+    context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+
+def extract_pages_sharded(pdf_path: Path, page_count: int, executor: ProcessPoolExecutor,
+                          shard_size: int = 32) -> DocumentSnapshot:
+    """Extract a large document in page shards on executor's processes, merged back in page order"""
+    starts = list(range(0, page_count, shard_size))
+    ends = [min(start + shard_size, page_count) for start in starts]
+    paths = [str(pdf_path)] * len(starts)
+    return DocumentSnapshot.merge(executor.map(_extract_shard, paths, starts, ends))
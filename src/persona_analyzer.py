@@ -1,37 +1,177 @@
 import json
 import time
 import re
-from typing import Dict, List, Any
+import heapq
+from typing import Dict, List, Any, Optional, Tuple, Iterator, Iterable, Callable
 from pathlib import Path
 from collections import defaultdict
-from .pdf_processor import PDFProcessor
-from .structure_extractor import StructureExtractor
-from sentence_transformers import SentenceTransformer, util
-import torch
+from .document_parser import DocumentParser, iter_parsed_documents
+from .embedding_cache import EmbeddingCache
+from .document_cache import DocumentCache
+from .embedding_backends import EmbeddingBackend, create_backend, cosine_similarities, cosine_similarity_matrix
+from .vector_index import SectionIndex, SectionIndexWriter, compact_index, index_lock, top_k_above
+from .corpus_manifest import CorpusManifest, CorpusChanges
+from .ann_index import update_ivf
+from . import instrumentation
+import numpy as np
 
 class PersonaAnalyzer:
-    def __init__(self):
-        self.processor = PDFProcessor()
-        self.extractor = StructureExtractor()
-        self.embedder = SentenceTransformer('paraphrase-MiniLM-L6-v2')
+    def __init__(self, batch_size: int = 32, score_threshold: float = 0.2, top_k: int = 5,
+                 window_batches: int = 8,
+                 embedding_cache: Optional[EmbeddingCache] = None,
+                 document_cache: Optional[DocumentCache] = None, workers: int = 1,
+                 page_workers: int = 1, backend: Optional[EmbeddingBackend] = None):
+        self.parser = DocumentParser(page_workers=page_workers)
+        self.workers = workers
+        self.backend = backend or create_backend()
+        self.embedding_cache = embedding_cache
+        self.document_cache = document_cache
+        self.batch_size = batch_size
+        # Sections are length-sorted and embedded a window of this many batches at a time
+        self.window_batches = window_batches
+        self.score_threshold = score_threshold
+        self.top_k = top_k
         self.persona = ""
         self.job_to_be_done = ""
+        self.progress: Optional[Callable[[str, int], None]] = None
 
-    def analyze_documents(self, pdf_files: List[Path], config: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze_documents(self, pdf_files: List[Path], config: Dict[str, Any],
+                          progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, Any]:
         self.persona = config.get("persona", "")
         self.job_to_be_done = config.get("job_to_be_done", "")
+        self.progress = progress
 
-        documents = self._extract_document_contents(pdf_files)
-        relevant_sections = self._extract_relevant_sections(documents)
+        # Streaming: parse -> sections -> embedded windows -> running top-k
+        with instrumentation.collect() as stats:
+            documents = self._iter_document_contents(pdf_files)
+            relevant_sections = self._extract_relevant_sections(documents)
+        return self._build_result([f.name for f in pdf_files], relevant_sections, stats)
+
+    def analyze_many(self, pdf_files: List[Path], configs: List[Dict[str, Any]],
+                     progress: Optional[Callable[[str, int], None]] = None) -> List[Dict[str, Any]]:
+        """One result per persona config, parsing and embedding the corpus only once.
+
+        All queries are encoded as one batch and scored against each window of sections
+        with a single (personas x sections) product; every persona keeps its own top-k.
+        """
+        self.progress = progress
+        with instrumentation.collect() as stats:
+            documents = self._iter_document_contents(pdf_files)
+            ranked = self._extract_relevant_sections_many(documents, configs)
+        return self._build_results([f.name for f in pdf_files], configs, ranked, stats)
+
+    def query_index_many(self, index: SectionIndex, configs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """analyze_many() answered from a prebuilt index (exact search)"""
+        if index.embedding_id != self.backend.cache_id:
+            raise ValueError(f"Index was built with {index.embedding_id}, "
+                             f"but the analyzer embeds with {self.backend.cache_id}")
+        with instrumentation.collect() as stats:
+            q_embeds = self._encode_queries(configs)
+            with instrumentation.timed("ranking"):
+                ranked = [
+                    [{**index.metadata[row], "score": score} for row, score in hits]
+                    for hits in index.search_many(q_embeds, self.top_k, self.score_threshold)
+                ] if len(configs) else []
+        return self._build_results(index.documents, configs, ranked, stats)
+
+    def build_index(self, pdf_files: List[Path], index_dir: Path, append: bool = False,
+                    ann_lists: int = 0) -> int:
+        """Embed every unique section of the corpus once and store it as a SectionIndex.
+
+        append=True adds only documents the index does not list yet, matched by file name:
+        a modified PDF keeps its old rows (sync_index() tracks content hashes instead).
+        ann_lists > 0 also trains (or extends) an IVF with that many lists for approximate
+        search.
+        """
+        with index_lock(index_dir):
+            writer = SectionIndexWriter(index_dir, self.backend.cache_id, append=append)
+            known = set(writer.documents)
+            new_files = [f for f in pdf_files if f.name not in known]
+            sections = self._deduplicate_sections(self._iter_document_contents(new_files))
+            for window, embeds in self._iter_embedded_windows(sections):
+                writer.add([s for _, s in window], embeds)
+            writer.close(f.name for f in new_files)
+            if ann_lists > 0 and writer.count:
+                index = SectionIndex(index_dir)
+                update_ivf(index.index_dir, index.vectors, ann_lists)
+        return writer.count
+
+    def sync_index(self, pdf_files: List[Path], index_dir: Path, ann_lists: int = 0) -> CorpusChanges:
+        """Bring an index in line with pdf_files, parsing and embedding only what changed.
+
+        A manifest of content hashes next to the index tells added, modified and deleted
+        files apart; rows of modified and deleted files are dropped, those of added and
+        modified files appended. The manifest is saved last, so an interrupted run is
+        simply repeated. The index is locked for the whole run, so concurrent syncs of it
+        take turns.
+        """
+        index_dir = Path(index_dir)
+        with index_lock(index_dir):
+            return self._sync_index(pdf_files, index_dir, ann_lists)
+
+    def _sync_index(self, pdf_files: List[Path], index_dir: Path, ann_lists: int) -> CorpusChanges:
+        manifest = CorpusManifest(index_dir)
+        try:
+            writer = SectionIndexWriter(index_dir, self.backend.cache_id, append=True)
+        except ValueError:
+            # Built with another embedding model: every document has to be embedded again
+            manifest.files = {}
+            writer = SectionIndexWriter(index_dir, self.backend.cache_id, append=False)
+        changes = manifest.diff(pdf_files)
+
+        fresh = set(changes.added + changes.changed)
+        # Added files can already have rows if a previous run stopped before its manifest
+        writer.remove_documents(set(changes.stale) | (fresh & set(writer.documents)))
+        new_files = [f for f in pdf_files if f.name in fresh]
+        sections = self._deduplicate_sections(self._iter_document_contents(new_files))
+        for window, embeds in self._iter_embedded_windows(sections):
+            writer.add([s for _, s in window], embeds)
+        writer.close(f.name for f in new_files)
+
+        compact_index(index_dir)
+        if ann_lists > 0 and writer.count:
+            index = SectionIndex(index_dir)
+            update_ivf(index.index_dir, index.vectors, ann_lists)
+        manifest.save(changes.entries)
+        return changes
+
+    def query_index(self, index: SectionIndex, config: Dict[str, Any],
+                    nprobe: Optional[int] = None) -> Dict[str, Any]:
+        """Answer a persona from a prebuilt index; only the query string is embedded.
+
+        nprobe switches to approximate IVF search when the index has one.
+        """
+        if index.embedding_id != self.backend.cache_id:
+            raise ValueError(f"Index was built with {index.embedding_id}, "
+                             f"but the analyzer embeds with {self.backend.cache_id}")
+        self.persona = config.get("persona", "")
+        self.job_to_be_done = config.get("job_to_be_done", "")
+
+        with instrumentation.collect() as stats:
+            with instrumentation.timed("embedding"):
+                q_embed = self.backend.encode(f"{self.persona}. {self.job_to_be_done}")
+            with instrumentation.timed("ranking"):
+                relevant_sections = [
+                    {**index.metadata[row], "score": score}
+                    for row, score in index.search(q_embed, self.top_k, self.score_threshold, nprobe=nprobe)
+                ]
+        return self._build_result(index.documents, relevant_sections, stats)
+
+    def _build_result(self, input_documents: List[str], relevant_sections: List[Dict[str, Any]],
+                      stats: Optional[instrumentation.StageStats] = None) -> Dict[str, Any]:
         subsection_analysis = self._refine_sections_content(relevant_sections)
 
+        metadata = {
+            "input_documents": [name.replace("_", " ") for name in input_documents],
+            "persona": self.persona,
+            "job_to_be_done": self.job_to_be_done,
+            "processing_timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+        if stats is not None and instrumentation.is_enabled():
+            metadata["timings"] = stats.as_dict()
+
         return {
-            "metadata": {
-                "input_documents": [f.name.replace("_", " ") for f in pdf_files],
-                "persona": self.persona,
-                "job_to_be_done": self.job_to_be_done,
-                "processing_timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")
-            },
+            "metadata": metadata,
             "extracted_sections": [
                 {
                     "document": s["document"].replace("_", " "),
@@ -44,69 +184,181 @@ class PersonaAnalyzer:
             "subsection_analysis": subsection_analysis
         }
 
-    def _extract_document_contents(self, pdf_files: List[Path]) -> List[Dict[str, Any]]:
-        docs = []
-        for pdf in pdf_files:
-            if not self.processor.load_pdf(pdf):
+    def _iter_document_contents(self, pdf_files: List[Path]) -> Iterator[Dict[str, Any]]:
+        for parsed, (pdf, sections) in enumerate(self._iter_document_sections(pdf_files), start=1):
+            self._report("documents_parsed", parsed)
+            if sections is None:
                 continue
-            structure = self.extractor.extract_structure(pdf)
-            full_text = self.processor.extract_all_text()
-            sections = self.processor.extract_sections_by_formatting()
-            enriched = []
             for sec in sections:
-                page_num = sec["page"] - 1
-                if page_num < self.processor.page_count:
-                    page_text = self.processor.extract_page_text(page_num)
-                    content = self._extract_section_content(page_text, sec["text"])
-                    enriched.append({
-                        "document": pdf.name,
-                        "section_title": sec["text"],
-                        "page": sec["page"],
-                        "combined": f"{sec['text']} {content}".strip()
-                    })
-            docs.extend(enriched)
-            self.processor.close()
-        return docs
-
-    def _extract_section_content(self, page_text: str, section_title: str) -> str:
-        lines = page_text.split('\n')
-        start_line = -1
-        for i, line in enumerate(lines):
-            if section_title.lower() in line.lower():
-                start_line = i
-                break
-        if start_line == -1:
-            return ""
-        end_line = len(lines)
-        for i in range(start_line + 1, len(lines)):
-            if self._looks_like_heading(lines[i].strip()):
-                end_line = i
-                break
-        return '\n'.join(lines[start_line + 1:end_line]).strip()
-
-    def _looks_like_heading(self, text: str) -> bool:
-        if len(text) < 3 or len(text) > 150:
-            return False
-        patterns = [r'^\d+\.?\s+[A-Z]', r'^[A-Z][A-Z\s]+$', r'^[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*$']
-        return any(re.match(p, text) for p in patterns)
-
-    def _extract_relevant_sections(self, sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+                yield {"document": pdf.name, **sec}
+
+    def _iter_document_sections(self, pdf_files: List[Path]) -> Iterator[Tuple[Path, Optional[List[Dict[str, Any]]]]]:
+        # Work out up front which files actually need parsing, so the misses can go to the pool
+        digests: Dict[Path, str] = {}
+        pending = []
+        queued = set()
+        for pdf in pdf_files:
+            if not self.document_cache:
+                pending.append(pdf)
+                continue
+            digest = self.document_cache.fingerprint(pdf)
+            digests[pdf] = digest
+            if digest not in queued and self.document_cache.get(digest) is None:
+                queued.add(digest)
+                pending.append(pdf)
+
+        parsed_iter = iter_parsed_documents(pending, self.workers, parser=self.parser)
+        failed = set()
+        for pdf in pdf_files:
+            digest = digests.get(pdf)
+            if digest is not None:
+                if digest in failed:
+                    yield pdf, None
+                    continue
+                cached = self.document_cache.get(digest)
+                if cached is not None:
+                    yield pdf, cached["sections"]
+                    continue
+
+            # pending preserves input order, so the next result belongs to this file
+            _, parsed = next(parsed_iter)
+            if parsed is None:
+                failed.add(digest)
+                yield pdf, None
+                continue
+            structure, sections = parsed
+            if digest is not None:
+                self.document_cache.put(digest, structure, sections)
+            yield pdf, sections
+
+    def _extract_relevant_sections(self, sections: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.top_k <= 0:
+            return []
         query = f"{self.persona}. {self.job_to_be_done}"
-        q_embed = self.embedder.encode(query, convert_to_tensor=True)
+        with instrumentation.timed("embedding"):
+            q_embed = self.backend.encode(query)
+
+        # Min-heap of (score, -arrival, seq); ties keep the earlier section, like a stable sort
+        heap: List[Tuple[float, int, int, Dict[str, Any]]] = []
+        for window, embeds in self._iter_embedded_windows(self._deduplicate_sections(sections)):
+            with instrumentation.timed("ranking"):
+                sims = cosine_similarities(q_embed, embeds).tolist()
+                for (seq, s), sim in zip(window, sims):
+                    if sim <= self.score_threshold:
+                        continue
+                    s["score"] = sim
+                    entry = (sim, -seq, seq, s)
+                    if len(heap) < self.top_k:
+                        heapq.heappush(heap, entry)
+                    elif entry[:2] > heap[0][:2]:
+                        heapq.heapreplace(heap, entry)
+
+        return [entry[3] for entry in sorted(heap, key=lambda e: (-e[0], e[2]))]
+
+    def _encode_queries(self, configs: List[Dict[str, Any]]) -> np.ndarray:
+        queries = [f"{c.get('persona', '')}. {c.get('job_to_be_done', '')}" for c in configs]
+        with instrumentation.timed("embedding"):
+            return self.backend.encode(queries, batch_size=self.batch_size)
+
+    def _extract_relevant_sections_many(self, sections: Iterable[Dict[str, Any]],
+                                        configs: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        if self.top_k <= 0 or not configs:
+            return [[] for _ in configs]
+        q_embeds = self._encode_queries(configs)
+
+        # Per persona the current top-k as (seq, score) arrays in arrival order, so that
+        # top_k_above's lowest-position tie break keeps the earlier section like the heap does
+        best_seq = [np.zeros(0, dtype=np.int64) for _ in configs]
+        best_score = [np.zeros(0, dtype=np.float64) for _ in configs]
+        kept: Dict[int, Dict[str, Any]] = {}
+        for window, embeds in self._iter_embedded_windows(self._deduplicate_sections(sections)):
+            with instrumentation.timed("ranking"):
+                sims = cosine_similarity_matrix(q_embeds, embeds)
+                window_seq = np.fromiter((seq for seq, _ in window), dtype=np.int64, count=len(window))
+                for i in range(len(configs)):
+                    seqs = np.concatenate([best_seq[i], window_seq])
+                    scores = np.concatenate([best_score[i], sims[i]])
+                    hits = top_k_above(scores, self.top_k, self.score_threshold)
+                    positions = np.array(sorted(pos for pos, _ in hits), dtype=np.int64)
+                    best_seq[i] = seqs[positions]
+                    best_score[i] = scores[positions]
+                kept.update(window)
+                # Forget sections no persona ranks any more
+                live = set(np.concatenate(best_seq).tolist())
+                kept = {seq: s for seq, s in kept.items() if seq in live}
+
+        ranked = []
+        for seqs, scores in zip(best_seq, best_score):
+            order = np.lexsort((seqs, -scores))
+            ranked.append([{**kept[int(seqs[j])], "score": float(scores[j])} for j in order])
+        return ranked
+
+    def _build_results(self, input_documents: List[str], configs: List[Dict[str, Any]],
+                       ranked: List[List[Dict[str, Any]]],
+                       stats: Optional[instrumentation.StageStats]) -> List[Dict[str, Any]]:
+        results = []
+        for config, sections in zip(configs, ranked):
+            self.persona = config.get("persona", "")
+            self.job_to_be_done = config.get("job_to_be_done", "")
+            results.append(self._build_result(input_documents, sections, stats))
+        return results
+
+    def _deduplicate_sections(self, sections: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
         seen = set()
-        scored = []
         for s in sections:
             key = (s["document"], s["section_title"])
             if key in seen:
                 continue
             seen.add(key)
-            sec_embed = self.embedder.encode(s["combined"], convert_to_tensor=True)
-            sim = util.pytorch_cos_sim(q_embed, sec_embed).item()
-            if sim > 0.2:
-                s["score"] = sim
-                scored.append(s)
-        scored.sort(key=lambda x: x["score"], reverse=True)
-        return scored[:5]  # Limit to top 5 most relevant
+            yield s
+
+    def _iter_embedded_windows(self, sections: Iterable[Dict[str, Any]]) -> Iterator[Tuple[List[Tuple[int, Dict[str, Any]]], np.ndarray]]:
+        # Only one window of sections and vectors is alive at a time
+        window_size = self.batch_size * self.window_batches
+        window: List[Tuple[int, Dict[str, Any]]] = []
+        embedded = 0
+        for seq, s in enumerate(sections):
+            window.append((seq, s))
+            if len(window) >= window_size:
+                embedded += len(window)
+                yield window, self._encode_batched([sec["combined"] for _, sec in window])
+                self._report("sections_embedded", embedded)
+                window = []
+        if window:
+            embedded += len(window)
+            yield window, self._encode_batched([sec["combined"] for _, sec in window])
+            self._report("sections_embedded", embedded)
+
+    def _encode_batched(self, texts: List[str]) -> np.ndarray:
+        with instrumentation.timed("embedding") as timer:
+            if timer.active:
+                timer.add_bytes(sum(len(t.encode("utf-8")) for t in texts))
+            return self._encode_with_cache(texts)
+
+    def _encode_with_cache(self, texts: List[str]) -> np.ndarray:
+        cached = {}
+        if self.embedding_cache is not None:
+            cached = self.embedding_cache.get_many(texts, self.backend.cache_id)
+        missing = [i for i in range(len(texts)) if i not in cached]
+
+        vectors: List[Optional[np.ndarray]] = [cached.get(i) for i in range(len(texts))]
+
+        # Encode in length order so each batch pads to similar lengths
+        missing.sort(key=lambda i: len(texts[i]))
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            batch_texts = [texts[i] for i in batch]
+            embeds = self.backend.encode(batch_texts, batch_size=self.batch_size)
+            for i, vec in zip(batch, embeds):
+                vectors[i] = vec
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many(batch_texts, embeds, self.backend.cache_id)
+
+        return np.stack(vectors)
+
+    def _report(self, field: str, value: int):
+        if self.progress:
+            self.progress(field, value)
 
     def _refine_sections_content(self, sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         refined = []
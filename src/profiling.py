@@ -0,0 +1,153 @@
+"""
+Opt-in profiling of one pipeline run, split by document and stage.
+
+A ProfileSession keeps one cProfile.Profile per (document, stage) and switches between
+them as the instrumentation stages are entered and left, so every pstats file covers a
+single stage of a single PDF. A sampling thread records the full stack of the profiled
+thread at a fixed interval; its output is in collapsed-stack format with the document
+and stage as the two root frames, ready for flamegraph.pl or speedscope.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from . import instrumentation
+
+# Tag of code that runs outside any stage, or outside any document
+OTHER = "other"
+NO_DOCUMENT = "-"
+
+# Only one session at a time; sys.setprofile-based profilers do not nest
+_session_lock = threading.Lock()
+
+
+def _safe_name(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", text).strip("_") or "unnamed"
+
+
+class ProfileSession:
+    """Profiles the thread that starts it until stop(), writing results to output_dir"""
+
+    def __init__(self, output_dir: Path, interval: float = 0.005):
+        self.output_dir = Path(output_dir)
+        self.interval = interval
+        self._profiles: Dict[Tuple[str, str], cProfile.Profile] = {}
+        self._stack: List[Tuple[str, str]] = []
+        self._samples: Counter = Counter()
+        self._thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    @classmethod
+    def try_start(cls, output_dir: Path, interval: float = 0.005) -> Optional["ProfileSession"]:
+        """A started session, or None while another session is already running"""
+        if not _session_lock.acquire(blocking=False):
+            return None
+        session = cls(output_dir, interval)
+        session.start()
+        return session
+
+    @property
+    def tag(self) -> Tuple[str, str]:
+        return self._stack[-1] if self._stack else (NO_DOCUMENT, OTHER)
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._started = time.perf_counter()
+        self._switch(None, self.tag)
+        instrumentation.set_listener(self)
+        self._sampler = threading.Thread(target=self._sample_loop, name="profile-sampler", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> List[Path]:
+        """Stop profiling and write the pstats, collapsed stacks and a summary; returns the files"""
+        try:
+            instrumentation.set_listener(None)
+            self._stop.set()
+            self._sampler.join()
+            self._profile(self.tag).disable()
+            return self._write()
+        finally:
+            _session_lock.release()
+
+    # Stage listener interface
+
+    def enter(self, stage: str, document: str):
+        if threading.get_ident() != self._thread_id:
+            return
+        previous = self.tag
+        # Stages without a document inherit the enclosing one; document scopes have no stage
+        self._stack.append((document or previous[0], stage or OTHER))
+        self._switch(previous, self.tag)
+
+    def exit(self, stage: str, document: str):
+        if threading.get_ident() != self._thread_id or not self._stack:
+            return
+        previous = self._stack.pop()
+        self._switch(previous, self.tag)
+
+    def _profile(self, tag: Tuple[str, str]) -> cProfile.Profile:
+        profile = self._profiles.get(tag)
+        if profile is None:
+            profile = self._profiles[tag] = cProfile.Profile()
+        return profile
+
+    def _switch(self, previous: Optional[Tuple[str, str]], current: Tuple[str, str]):
+        if previous == current:
+            return
+        if previous is not None:
+            self._profile(previous).disable()
+        self._profile(current).enable()
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            document, stage = self.tag
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            frames.append(stage)
+            frames.append(document.replace(";", "_"))
+            self._samples[";".join(reversed(frames))] += 1
+
+    def _write(self) -> List[Path]:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        written = []
+        summary = {"wall_seconds": round(time.perf_counter() - self._started, 4),
+                   "sample_interval_ms": self.interval * 1000, "profiles": []}
+        for (document, stage), profile in self._profiles.items():
+            stats = pstats.Stats(profile)
+            if not stats.stats:
+                continue
+            path = self.output_dir / f"{_safe_name(document)}.{_safe_name(stage)}.pstats"
+            stats.dump_stats(path)
+            written.append(path)
+            summary["profiles"].append({"document": document, "stage": stage, "file": path.name,
+                                        "seconds": round(stats.total_tt, 4)})
+        summary["profiles"].sort(key=lambda p: p["seconds"], reverse=True)
+
+        collapsed = self.output_dir / "stacks.collapsed"
+        with open(collapsed, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self._samples.items()):
+                f.write(f"{stack} {count}\n")
+        written.append(collapsed)
+
+        summary_path = self.output_dir / "summary.json"
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        written.append(summary_path)
+        return written
@@ -0,0 +1,63 @@
+"""
+Single-pass segmentation of a document's spans into headed sections with their body text
+"""
+
+from typing import List, Dict, Any
+
+from .document_snapshot import DocumentSnapshot
+
+
+def _same_line(prev_bbox, bbox) -> bool:
+    """A span continues the previous line when its vertical midpoint falls inside it"""
+    middle = (bbox[1] + bbox[3]) / 2
+    return prev_bbox[1] <= middle <= prev_bbox[3]
+
+
+def segment_sections(snapshot: DocumentSnapshot) -> List[Dict[str, Any]]:
+    """Headings of every page with the text that follows them, in reading order.
+
+    Each span is visited once: heading spans open a new section and every other span is
+    appended to the nearest preceding heading, including across page breaks. Text before
+    the first heading of the document belongs to no section.
+    """
+    sections = []
+    body: List[str] = []
+    prev_bbox = None
+
+    def close_section():
+        if sections:
+            sections[-1]["content"] = "".join(body).strip()
+
+    for page_num in range(snapshot.page_count):
+        spans = snapshot.spans(page_num)
+        if not spans:
+            continue
+        levels = dict(snapshot.headings(page_num))
+        texts = spans.texts()
+        bboxes = spans.bboxes
+        for i, text in enumerate(texts):
+            level = levels.get(i)
+            if level is not None:
+                close_section()
+                sections.append({
+                    "text": text.strip(),
+                    "level": level,
+                    "page": page_num + 1,  # 1-based page numbering
+                    "content": ""
+                })
+                body = []
+                prev_bbox = None
+                continue
+            if not sections:
+                continue
+            bbox = bboxes[4 * i:4 * i + 4]
+            if prev_bbox is not None and not _same_line(prev_bbox, bbox):
+                body.append("\n")
+            body.append(text)
+            prev_bbox = bbox
+        # A page break always ends the current line
+        prev_bbox = None
+        if body and body[-1] != "\n":
+            body.append("\n")
+    close_section()
+    return sections
@@ -0,0 +1,128 @@
+"""
+Compact struct-of-arrays storage for a page's formatted text spans
+"""
+
+from array import array
+from typing import List, Dict, Any, Iterator, Union
+
+
+class FontTable:
+    """Interns font names so each span stores a small integer id"""
+
+    __slots__ = ("names", "_ids")
+
+    def __init__(self):
+        self.names: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def intern(self, name: str) -> int:
+        font_id = self._ids.get(name)
+        if font_id is None:
+            font_id = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return font_id
+
+    def __getstate__(self):
+        return self.names
+
+    def __setstate__(self, names):
+        self.names = names
+        self._ids = {name: i for i, name in enumerate(names)}
+
+
+class PageSpans:
+    """The non-empty spans of one page, stored column-wise.
+
+    Sizes and bboxes are float32 arrays (MuPDF computes them in single precision, so
+    nothing is lost), flags an int32 array, fonts ids into a shared FontTable, and all
+    span texts one string sliced by an offsets array. Indexing or iterating yields the
+    same dicts extract_text_with_formatting always returned.
+    """
+
+    __slots__ = ("page", "fonts", "_text", "_offsets", "_sizes", "_flags", "_bboxes", "_font_ids")
+
+    def __init__(self, page: int, fonts: FontTable):
+        self.page = page
+        self.fonts = fonts
+        self._text = ""
+        self._offsets = array("I", [0])
+        self._sizes = array("f")
+        self._flags = array("i")
+        self._bboxes = array("f")
+        self._font_ids = array("I")
+
+    @classmethod
+    def from_text_dict(cls, text_dict: Dict[str, Any], page_num: int, fonts: FontTable) -> "PageSpans":
+        """Flatten a page's "dict" output into the non-empty spans we work with"""
+        spans = cls(page_num, fonts)
+        texts = []
+        length = 0
+        for block in text_dict.get("blocks", []):
+            if "lines" in block:
+                for line in block["lines"]:
+                    for span in line.get("spans", []):
+                        text = span.get("text", "")
+                        if text.strip():
+                            texts.append(text)
+                            length += len(text)
+                            spans._offsets.append(length)
+                            spans._sizes.append(span.get("size", 0))
+                            spans._flags.append(span.get("flags", 0))
+                            spans._bboxes.extend(span.get("bbox", (0, 0, 0, 0)))
+                            spans._font_ids.append(fonts.intern(span.get("font", "")))
+        spans._text = "".join(texts)
+        return spans
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        if isinstance(index, slice):
+            return [self._span(i) for i in range(len(self))[index]]
+        return self._span(range(len(self))[index])
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self._span(i)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __eq__(self, other) -> bool:
+        # Compares like the list of dicts it replaces
+        if isinstance(other, (PageSpans, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def _span(self, i: int) -> Dict[str, Any]:
+        return {
+            "text": self.text(i),
+            "font": self.fonts.names[self._font_ids[i]],
+            "size": self._sizes[i],
+            "flags": self._flags[i],
+            "bbox": tuple(self._bboxes[4 * i:4 * i + 4]),
+            "page": self.page
+        }
+
+    def text(self, i: int) -> str:
+        return self._text[self._offsets[i]:self._offsets[i + 1]]
+
+    def texts(self) -> List[str]:
+        return [self._text[self._offsets[i]:self._offsets[i + 1]] for i in range(len(self))]
+
+    # Raw columns for vectorised consumers (wrap with numpy.frombuffer, no copies)
+
+    @property
+    def sizes(self) -> array:
+        return self._sizes
+
+    @property
+    def flags(self) -> array:
+        return self._flags
+
+    @property
+    def bboxes(self) -> array:
+        """x0, y0, x1, y1 of every span, flattened"""
+        return self._bboxes
@@ -297,17 +297,26 @@
         
 #         return sections
 import re
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from pathlib import Path
-from .pdf_processor import PDFProcessor
+from .pdf_processor import PDFProcessor, PDFInput, source_name
+from .document_snapshot import DocumentSnapshot
+from .heading_classifier import outline_numbering_level
+from . import instrumentation
 
 class StructureExtractor:
     def __init__(self):
         self.processor = PDFProcessor()
 
-    def extract_structure(self, pdf_path: Path) -> Dict[str, Any]:
+    def extract_structure(self, pdf_path: PDFInput, snapshot: Optional[DocumentSnapshot] = None) -> Dict[str, Any]:
+        with instrumentation.document(source_name(pdf_path)):
+            return self._extract_structure(pdf_path, snapshot)
+
+    def _extract_structure(self, pdf_path: PDFInput, snapshot: Optional[DocumentSnapshot]) -> Dict[str, Any]:
         try:
-            if not self.processor.load_pdf(pdf_path):
+            if snapshot is not None:
+                self.processor.use_snapshot(snapshot)
+            elif not self.processor.load_pdf(pdf_path):
                 return {"title": "Error", "outline": [], "error": "Failed to load PDF"}
 
             title = self._extract_title()
@@ -359,13 +368,7 @@ class StructureExtractor:
         return refined
 
     def _determine_heading_level_from_numbering(self, text: str) -> str:
-        if re.match(r'^\d+\s', text):
-            return "H1"
-        elif re.match(r'^\d+\.\d+\s', text):
-            return "H2"
-        elif re.match(r'^\d+\.\d+\.\d+\s', text):
-            return "H3"
-        return ""
+        return outline_numbering_level(text)
 
     def _determine_level_by_font(self, size: float) -> str:
         if size >= 16:
@@ -0,0 +1,133 @@
+"""
+Uploaded PDFs held in memory, spilled to a uniquely named file only when large
+"""
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+_READ_CHUNK = 1 << 20
+
+
+class UploadBuffer:
+    """Collects an upload chunk by chunk, e.g. from a streaming multipart parser.
+
+    It can serve as the file stream werkzeug's form parser writes a part into; the parser
+    only rewinds the finished part and later closes it.
+    """
+
+    def __init__(self, name: str, spill_threshold: int, spill_dir: Path):
+        self.name = name
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self._digest = hashlib.sha256()
+        self._buffer = bytearray()
+        self._spill = None
+        self._finished = False
+
+    def write(self, chunk: bytes):
+        self._digest.update(chunk)
+        if self._spill is not None:
+            self._spill.write(chunk)
+            return
+        self._buffer += chunk
+        if len(self._buffer) > self.spill_threshold:
+            self._spill = tempfile.NamedTemporaryFile(dir=self.spill_dir, suffix=".pdf", delete=False)
+            self._spill.write(self._buffer)
+            self._buffer = bytearray()
+
+    def spills(self, size: int = 0) -> bool:
+        """Whether writing size more bytes (or finishing, for 0) touches the disk"""
+        return self._spill is not None or len(self._buffer) + size > self.spill_threshold
+
+    def finish(self) -> "UploadedPDF":
+        """The received content as an UploadedPDF, which takes over the buffer or spill file"""
+        self._finished = True
+        if self._spill is not None:
+            self._spill.close()
+            return UploadedPDF(self.name, path=Path(self._spill.name), sha256=self._digest.hexdigest())
+        data, self._buffer = self._buffer, bytearray()
+        return UploadedPDF(self.name, data=data, sha256=self._digest.hexdigest())
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        # Werkzeug rewinds every finished part; the content is read by finish() instead
+        return 0
+
+    def close(self):
+        """Discard the content unless finish() handed it over"""
+        if not self._finished:
+            self.discard()
+
+    def discard(self):
+        """Drop what was received; a spill file is deleted"""
+        self._buffer = bytearray()
+        if self._spill is not None:
+            self._spill.close()
+            os.unlink(self._spill.name)
+            self._spill = None
+
+
+class UploadedPDF:
+    """An upload's bytes (or spill file) plus the original file name.
+
+    Exposes `name` and `stem` like a Path, so the parsing pipeline and the document cache
+    can take it wherever they take a PDF path.
+    """
+
+    def __init__(self, name: str, data: Optional[bytearray] = None, path: Optional[Path] = None,
+                 sha256: Optional[str] = None):
+        self.name = name
+        self.data = data
+        self.path = path
+        self._sha256 = sha256
+
+    @classmethod
+    def from_stream(cls, name: str, stream: BinaryIO, spill_threshold: int,
+                    spill_dir: Path) -> "UploadedPDF":
+        """Read an upload stream once, hashing it on the way; past spill_threshold bytes
+        the content goes to a fresh file in spill_dir instead of memory"""
+        buffer = UploadBuffer(name, spill_threshold, spill_dir)
+        try:
+            for chunk in iter(lambda: stream.read(_READ_CHUNK), b""):
+                buffer.write(chunk)
+        except BaseException:
+            buffer.discard()
+            raise
+        return buffer.finish()
+
+    @property
+    def stem(self) -> str:
+        return Path(self.name).stem
+
+    @property
+    def size(self) -> int:
+        return len(self.data) if self.data is not None else self.path.stat().st_size
+
+    def sha256(self) -> str:
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.data if self.data is not None
+                                          else self.path.read_bytes()).hexdigest()
+        return self._sha256
+
+    def save(self, target: Path):
+        """Store the content at target, moving a spill file rather than copying it; the
+        upload is empty afterwards"""
+        if self.path is not None:
+            os.replace(self.path, target)
+            self.path = None
+        else:
+            Path(target).write_bytes(self.data)
+            self.data = None
+
+    def close(self):
+        """Release the content; a spill file is deleted"""
+        self.data = None
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+            self.path = None
+
+    def __repr__(self) -> str:
+        where = "memory" if self.data is not None else str(self.path)
+        return f"UploadedPDF({self.name!r}, {where})"
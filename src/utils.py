@@ -119,3 +119,21 @@ def create_error_response(error_message: str, round_type: str = "1A") -> Dict[st
             "extracted_sections": [],
             "subsection_analysis": []
         }
+
+def get_rss_bytes() -> int:
+    """Current resident set size of this process in bytes (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        import os
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return get_peak_rss_bytes()
+
+def get_peak_rss_bytes() -> int:
+    """Highest resident set size this process has reached, in bytes"""
+    import resource
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
@@ -0,0 +1,327 @@
+"""
+On-disk section embedding index for answering many persona queries over a fixed corpus.
+
+An index directory holds versions of the index in subdirectories plus a `current`
+symlink to the published one. Rebuilds and compactions write a new version and swap the
+link with one rename, so a reader opening the index mid-write still sees a complete one.
+Appends extend the current version in place and never rewrite existing bytes; readers
+only look at the rows its header counts. Indexes from before versioning, with the files
+directly in the directory, are still read, and are converted by their next rebuild or
+compaction.
+
+Only one process may write an index at a time: writers take index_lock() first.
+"""
+
+import itertools
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, List, Tuple, Iterable, Optional, Set
+
+import numpy as np
+
+from .ann_index import IVFIndex, IVF_FILE
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+VECTORS_FILE = "vectors.f32"
+METADATA_FILE = "metadata.jsonl"
+INDEX_FILE = "index.json"
+CURRENT_LINK = "current"
+LOCK_FILE = ".lock"
+_VERSION_PREFIX = "version-"
+# Rows copied per step when compacting, to bound temporary memory
+_COMPACT_CHUNK = 65536
+
+
+def _write_header(index_dir: Path, header: Dict[str, Any]):
+    tmp_path = Path(index_dir) / (INDEX_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(header, f, indent=2, ensure_ascii=False)
+    tmp_path.replace(Path(index_dir) / INDEX_FILE)
+
+
+@contextmanager
+def index_lock(index_dir: Path):
+    """Hold an exclusive lock on the index until the block ends, waiting for other writers.
+
+    Without fcntl (Windows) nothing is locked.
+    """
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    with open(index_dir / LOCK_FILE, "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def index_data_dir(index_dir: Path) -> Path:
+    """Directory with the files of the published index version"""
+    index_dir = Path(index_dir)
+    try:
+        return index_dir / os.readlink(index_dir / CURRENT_LINK)
+    except OSError:
+        # No version published yet, or an index written before versioning
+        return index_dir
+
+
+def _new_version(index_dir: Path) -> Path:
+    version_dir = Path(index_dir) / f"{_VERSION_PREFIX}{time.time_ns()}"
+    version_dir.mkdir(parents=True)
+    return version_dir
+
+
+def _publish(index_dir: Path, version_dir: Path):
+    """Point `current` at version_dir and remove the versions before the one it replaces"""
+    index_dir = Path(index_dir)
+    previous = index_data_dir(index_dir)
+    tmp_link = index_dir / (CURRENT_LINK + ".tmp")
+    tmp_link.unlink(missing_ok=True)
+    os.symlink(version_dir.name, tmp_link)
+    os.replace(tmp_link, index_dir / CURRENT_LINK)
+    # The replaced version stays until the next publish, for readers that resolved it
+    # just before the swap; anything older (or left by an interrupted build) goes
+    keep = {version_dir.name, previous.name}
+    for path in index_dir.iterdir():
+        if path.name.startswith(_VERSION_PREFIX) and path.name not in keep and not path.is_symlink():
+            shutil.rmtree(path, ignore_errors=True)
+    if previous == index_dir:
+        for name in (VECTORS_FILE, METADATA_FILE, INDEX_FILE, IVF_FILE):
+            (index_dir / name).unlink(missing_ok=True)
+
+
+class SectionIndexWriter:
+    """Appends L2-normalised section vectors and their metadata to an index directory.
+
+    Rows of removed documents are not rewritten but listed as deleted in the header;
+    compact_index() drops them once they make up a large part of the index. Without
+    append the index is written as a new version, published by close().
+    """
+
+    def __init__(self, index_dir: Path, embedding_id: str, append: bool = False):
+        self.root = Path(index_dir)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_dir = index_data_dir(self.root)
+        self.embedding_id = embedding_id
+        self.count = 0
+        self.dim = 0
+        self.documents: List[str] = []
+        self.deleted: Set[int] = set()
+
+        header_path = self.index_dir / INDEX_FILE
+        append = append and header_path.exists()
+        if append:
+            with open(header_path, "r", encoding="utf-8") as f:
+                header = json.load(f)
+            if header["embedding_id"] != embedding_id:
+                raise ValueError(f"Cannot append {embedding_id} vectors to an index of {header['embedding_id']}")
+            self.count = header["count"]
+            self.dim = header["dim"]
+            self.documents = header.get("documents", [])
+            self.deleted = set(header.get("deleted", []))
+            # Drop bytes of rows an interrupted append wrote after the last header
+            self._truncate(self.index_dir / VECTORS_FILE, self.count * self.dim * 4)
+        else:
+            # A fresh version starts without an IVF; one trained on the old rows would
+            # bucket the new ones wrongly even when the row counts happen to match
+            self.index_dir = _new_version(self.root)
+        self._fresh = not append
+        mode = "a" if append else "w"
+        self._vectors = open(self.index_dir / VECTORS_FILE, mode + "b")
+        self._metadata = open(self.index_dir / METADATA_FILE, mode, encoding="utf-8")
+        if append:
+            self._truncate_metadata(self.count)
+
+    @staticmethod
+    def _truncate(path: Path, size: int):
+        if path.exists() and path.stat().st_size > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+    def _truncate_metadata(self, rows: int):
+        # Cut after the first `rows` lines in place; readers may be parsing them right now
+        path = self.index_dir / METADATA_FILE
+        with open(path, "rb") as f:
+            for _ in itertools.islice(f, rows):
+                pass
+            size = f.tell()
+        self._truncate(path, size)
+
+    def remove_documents(self, names: Iterable[str]):
+        """Mark every row of these documents deleted and drop them from the document list"""
+        names = set(names)
+        if not names:
+            return
+        self._metadata.flush()
+        with open(self.index_dir / METADATA_FILE, "r", encoding="utf-8") as f:
+            for row, line in enumerate(f):
+                if row >= self.count:
+                    break
+                if json.loads(line)["document"] in names:
+                    self.deleted.add(row)
+        self.documents = [name for name in self.documents if name not in names]
+
+    def add(self, sections: List[Dict[str, Any]], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        self._vectors.write(np.ascontiguousarray(vectors / norms, dtype=np.float32).tobytes())
+        for s in sections:
+            self._metadata.write(json.dumps({
+                "document": s["document"],
+                "section_title": s["section_title"],
+                "page": s["page"]
+            }, ensure_ascii=False) + "\n")
+        self.count += len(sections)
+        self.dim = vectors.shape[1]
+
+    def close(self, documents: Iterable[str]):
+        """Finish the index; the header is written last so a partial build is never loaded"""
+        self._vectors.close()
+        self._metadata.close()
+        for name in documents:
+            if name not in self.documents:
+                self.documents.append(name)
+        # Deletions live in the header so they take effect together with the new rows
+        _write_header(self.index_dir, {
+            "embedding_id": self.embedding_id,
+            "count": self.count,
+            "dim": self.dim,
+            "documents": self.documents,
+            "deleted": sorted(self.deleted)
+        })
+        if self._fresh:
+            _publish(self.root, self.index_dir)
+
+
+class SectionIndex:
+    """Memory-mapped float32 section matrix plus per-row metadata"""
+
+    def __init__(self, index_dir: Path):
+        # Resolved once, so every file below comes from the same version
+        self.index_dir = index_data_dir(index_dir)
+        with open(self.index_dir / INDEX_FILE, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        self.embedding_id: str = header["embedding_id"]
+        self.documents: List[str] = header.get("documents", [])
+        self.count: int = header["count"]
+        self.dim: int = header["dim"]
+        deleted = header.get("deleted", [])
+        # Mask of rows that are still searchable; None when nothing was deleted
+        self.live: Optional[np.ndarray] = None
+        if deleted:
+            self.live = np.ones(self.count, dtype=bool)
+            self.live[np.asarray(deleted, dtype=np.int64)] = False
+        if self.count:
+            self.vectors = np.memmap(self.index_dir / VECTORS_FILE, dtype=np.float32,
+                                     mode="r", shape=(self.count, self.dim))
+        else:
+            self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        # Lines past count may belong to an append still in progress
+        with open(self.index_dir / METADATA_FILE, "r", encoding="utf-8") as f:
+            self.metadata: List[Dict[str, Any]] = [json.loads(line) for line in itertools.islice(f, self.count)]
+        self.ann = IVFIndex.load(self.index_dir)
+        if self.ann is not None and (len(self.ann.assignments) != self.count
+                                     or self.ann.centroids.shape[1] != self.dim):
+            # Rows were appended without updating the IVF, or it belongs to other
+            # vectors; fall back to exact search
+            self.ann = None
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of query against every indexed section"""
+        query = np.asarray(query, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        return self.vectors @ query
+
+    def search(self, query: np.ndarray, top_k: int, threshold: float,
+               nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Rows scoring above threshold, best first; equal scores keep index order.
+
+        With nprobe and a trained IVF only the rows of the nprobe nearest buckets are scored.
+        """
+        if nprobe is None or self.ann is None:
+            scores = self.scores(query)
+            if self.live is not None:
+                scores = np.where(self.live, scores, -np.inf)
+            return top_k_above(scores, top_k, threshold)
+
+        rows = self.ann.candidates(query, nprobe)
+        if self.live is not None:
+            rows = rows[self.live[rows]]
+        query = np.asarray(query, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        hits = top_k_above(self.vectors[rows] @ query, top_k, threshold)
+        return [(int(rows[i]), score) for i, score in hits]
+
+    def search_many(self, queries: np.ndarray, top_k: int, threshold: float,
+                    query_chunk: int = 64) -> List[List[Tuple[int, float]]]:
+        """Exact search() for every row of queries, scoring a chunk of queries per matrix product"""
+        queries = np.asarray(queries, dtype=np.float32)
+        queries = queries / np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+        results = []
+        for start in range(0, len(queries), query_chunk):
+            scores = self.vectors @ queries[start:start + query_chunk].T
+            if self.live is not None:
+                scores[~self.live] = -np.inf
+            results.extend(top_k_above(scores[:, j], top_k, threshold) for j in range(scores.shape[1]))
+        return results
+
+
+def compact_index(index_dir: Path, max_deleted_fraction: float = 0.25) -> bool:
+    """Rewrite the index without its deleted rows once they exceed max_deleted_fraction.
+
+    The compacted copy is written and published as a new version; an IVF keeps its
+    centroids and the assignments of the surviving rows.
+    """
+    index_dir = Path(index_dir)
+    index = SectionIndex(index_dir)
+    if index.live is None or (index.count - int(index.live.sum())) <= max_deleted_fraction * index.count:
+        return False
+
+    new_dir = _new_version(index_dir)
+    live_rows = np.flatnonzero(index.live)
+    with open(new_dir / VECTORS_FILE, "wb") as f:
+        for start in range(0, len(live_rows), _COMPACT_CHUNK):
+            f.write(np.ascontiguousarray(index.vectors[live_rows[start:start + _COMPACT_CHUNK]]).tobytes())
+    with open(new_dir / METADATA_FILE, "w", encoding="utf-8") as f:
+        for row in live_rows:
+            f.write(json.dumps(index.metadata[row], ensure_ascii=False) + "\n")
+    if index.ann is not None:
+        IVFIndex(index.ann.centroids, index.ann.assignments[live_rows]).save(new_dir)
+    _write_header(new_dir, {
+        "embedding_id": index.embedding_id,
+        "count": len(live_rows),
+        "dim": index.dim,
+        "documents": index.documents,
+        "deleted": []
+    })
+    del index
+    _publish(index_dir, new_dir)
+    return True
+
+
+def top_k_above(scores: np.ndarray, top_k: int, threshold: float) -> List[Tuple[int, float]]:
+    """(row, score) of the top_k scores above threshold, ties broken by lower row first"""
+    candidates = np.flatnonzero(scores > threshold)
+    if top_k <= 0 or not len(candidates):
+        return []
+    cand_scores = scores[candidates]
+    if len(candidates) > top_k:
+        # argpartition finds the k-th best value; keep everything strictly above it and
+        # fill up with the earliest rows that tie with it so the cut is deterministic
+        kth = cand_scores[np.argpartition(-cand_scores, top_k - 1)[top_k - 1]]
+        above = candidates[cand_scores > kth]
+        ties = candidates[cand_scores == kth][:top_k - len(above)]
+        candidates = np.concatenate([above, ties])
+        cand_scores = scores[candidates]
+    order = np.lexsort((candidates, -cand_scores))
+    return [(int(candidates[i]), float(cand_scores[i])) for i in order]
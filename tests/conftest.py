@@ -0,0 +1,61 @@
+"""
+Shared fixtures: a deterministic embedding backend and small generated PDFs, so the
+tests need neither ML models nor the input/ corpus.
+"""
+
+import hashlib
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pytest
+
+from bench.synthetic import generate_pdf
+from src.embedding_backends import EmbeddingBackend
+
+
+class FakeBackend(EmbeddingBackend):
+    """Hash-seeded vectors; records the texts of every encode call"""
+
+    name = "fake"
+
+    def __init__(self, dim: int = 8, cache_id: str = "fake"):
+        self.dim = dim
+        self._cache_id = cache_id
+        self.calls: List[List[str]] = []
+
+    @property
+    def cache_id(self) -> str:
+        return self._cache_id
+
+    def _encode_batch(self, texts: List[str], batch_size: int) -> np.ndarray:
+        self.calls.append(list(texts))
+        return np.stack([self.vector(t) for t in texts])
+
+    def vector(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(f"{self._cache_id}\0{text}".encode()).digest()[:4], "little")
+        return np.random.default_rng(seed).normal(size=self.dim).astype(np.float32)
+
+    @property
+    def texts_encoded(self) -> int:
+        return sum(len(c) for c in self.calls)
+
+
+@pytest.fixture
+def fake_backend() -> FakeBackend:
+    return FakeBackend()
+
+
+@pytest.fixture
+def pdf_dir(tmp_path: Path) -> Path:
+    """A directory with three small PDFs of different content"""
+    directory = tmp_path / "pdfs"
+    directory.mkdir()
+    for seed in range(3):
+        generate_pdf(directory / f"doc{seed}.pdf", pages=3, headings_per_page=2, seed=seed)
+    return directory
+
+
+@pytest.fixture
+def pdf_files(pdf_dir: Path) -> List[Path]:
+    return sorted(pdf_dir.glob("*.pdf"))
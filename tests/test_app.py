@@ -0,0 +1,129 @@
+import importlib
+import io
+import json
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def flask_app(tmp_path_factory):
+    """app.py imported inside a scratch directory; it creates its folders and caches in the cwd"""
+    workdir = tmp_path_factory.mktemp("app")
+    previous = os.getcwd()
+    os.chdir(workdir)
+    try:
+        module = importlib.import_module("app")
+        module.app.config["TESTING"] = True
+        yield module
+    finally:
+        os.chdir(previous)
+
+
+def upload(client, pdf_files, **form):
+    data = {"files[]": [(io.BytesIO(p.read_bytes()), p.name) for p in pdf_files], **form}
+    return client.post("/upload", data=data, content_type="multipart/form-data")
+
+
+def test_structure_upload_fills_document_cache(flask_app, pdf_files):
+    client = flask_app.app.test_client()
+    digest = flask_app.document_cache.fingerprint(pdf_files[0])
+    assert flask_app.document_cache.get(digest) is None
+
+    response = upload(client, pdf_files[:1], mode="structure")
+    assert response.status_code == 200
+    cached = flask_app.document_cache.get(digest)
+    assert cached is not None and cached["sections"]
+    assert response.get_json()["results"][0]["sections"] == len(cached["structure"]["outline"])
+
+
+def test_uploads_write_their_own_output(flask_app, pdf_files, fake_backend, monkeypatch):
+    monkeypatch.setattr(flask_app, "embedding_backend", lambda: fake_backend)
+    client = flask_app.app.test_client()
+    output_dir = Path(flask_app.app.config["OUTPUT_FOLDER"])
+
+    names = []
+    for persona in ("Chef", "Historian"):
+        response = upload(client, pdf_files, mode="persona", persona=persona, job_description="Plan a menu")
+        assert response.status_code == 200
+        (result,) = response.get_json()["results"]
+        names.append(result["output_file"])
+        assert json.loads((output_dir / result["output_file"]).read_text())["metadata"]["persona"] == persona
+    for _ in range(2):
+        response = upload(client, pdf_files[:1], mode="structure")
+        names.append(response.get_json()["results"][0]["output_file"])
+    assert len(set(names)) == 4
+    assert all((output_dir / name).exists() for name in names)
+
+
+def wait_for_job(client, job_id, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").get_json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_concurrent_persona_jobs_keep_their_own_output(flask_app, pdf_files, fake_backend, monkeypatch):
+    monkeypatch.setattr(flask_app, "embedding_backend", lambda: fake_backend)
+    client = flask_app.app.test_client()
+
+    job_ids = {}
+    for persona in ("Chef", "Historian"):
+        data = {"files[]": [(io.BytesIO(p.read_bytes()), p.name) for p in pdf_files],
+                "mode": "persona", "persona": persona, "job_description": "Plan a menu"}
+        response = client.post("/jobs", data=data, content_type="multipart/form-data")
+        assert response.status_code == 202
+        job_ids[persona] = response.get_json()["job_id"]
+
+    names = set()
+    for persona, job_id in job_ids.items():
+        job = wait_for_job(client, job_id)
+        assert job["status"] == "done", job["error"]
+        (name,) = job["result"]["output_files"]
+        assert job_id in name
+        names.add(name)
+        written = json.loads((Path(flask_app.app.config["OUTPUT_FOLDER"]) / name).read_text())
+        assert written["metadata"]["persona"] == persona
+    assert len(names) == 2
+
+
+@pytest.mark.parametrize("spill_bytes", [1 << 30, 1024])
+def test_uploads_are_parsed_into_upload_buffers(flask_app, pdf_files, monkeypatch, spill_bytes):
+    monkeypatch.setitem(flask_app.app.config, "UPLOAD_SPILL_BYTES", spill_bytes)
+    # The multipart parser already buffered and hashed each part; nothing reads it again
+    monkeypatch.setattr(flask_app.UploadedPDF, "from_stream", None)
+    read = []
+    monkeypatch.setattr(flask_app, "process_uploaded_files",
+                        lambda uploads, *args, **kwargs: read.extend(
+                            (u.name, u.sha256(), u.path is not None) for u in uploads) or [])
+    client = flask_app.app.test_client()
+
+    response = upload(client, pdf_files, mode="structure")
+    assert response.status_code == 200, response.get_json()
+    assert [(name, digest) for name, digest, _ in read] == [
+        (p.name, flask_app.document_cache.fingerprint(p)) for p in pdf_files]
+    assert all(spilled == (spill_bytes == 1024) for _, _, spilled in read)
+    assert list(Path(flask_app.app.config["UPLOAD_FOLDER"]).glob("*.pdf")) == []
+
+
+def test_job_keeps_uploads_that_share_a_name(flask_app, pdf_files):
+    client = flask_app.app.test_client()
+    data = {"files[]": [(io.BytesIO(p.read_bytes()), "report.pdf") for p in pdf_files[:2]], "mode": "structure"}
+    response = client.post("/jobs", data=data, content_type="multipart/form-data")
+    assert response.status_code == 202
+    job = wait_for_job(client, response.get_json()["job_id"])
+    assert job["status"] == "done", job["error"]
+
+    results = job["result"]["results"]
+    assert [r["filename"] for r in results] == ["report.pdf", "report.pdf"]
+    outputs = job["result"]["output_files"]
+    assert len(set(outputs)) == 2
+    for pdf, name in zip(pdf_files, outputs):
+        written = json.loads((Path(flask_app.app.config["OUTPUT_FOLDER"]) / name).read_text())
+        expected = flask_app.document_cache.get(flask_app.document_cache.fingerprint(pdf))["structure"]
+        assert written == expected
@@ -0,0 +1,87 @@
+import asyncio
+import importlib
+import io
+import json
+import os
+from pathlib import Path
+
+import pytest
+from werkzeug.test import EnvironBuilder
+
+from src.embedding_scheduler import EmbeddingScheduler
+
+
+@pytest.fixture(scope="module")
+def asgi(tmp_path_factory):
+    """asgi_app imported and started inside a scratch directory"""
+    workdir = tmp_path_factory.mktemp("asgi")
+    previous = os.getcwd()
+    os.chdir(workdir)
+    try:
+        module = importlib.import_module("asgi_app")
+        module.config["PARSE_WORKERS"] = 2
+        module.service.start()
+        yield module
+        module.service.stop()
+    finally:
+        os.chdir(previous)
+
+
+async def call(asgi, method, path, data=None):
+    """Run one request through the ASGI app; returns its status and body"""
+    headers, body = [], b""
+    if data is not None:
+        builder = EnvironBuilder(method=method, data=data)
+        environ = builder.get_environ()
+        body = environ["wsgi.input"].read()
+        headers = [(b"content-type", environ["CONTENT_TYPE"].encode())]
+    scope = {"type": "http", "method": method, "path": path, "headers": headers}
+    # Delivered in several messages, like a server streaming the body
+    chunks = [body[i:i + 4096] for i in range(0, len(body), 4096)] or [b""]
+    sent = []
+
+    async def receive():
+        chunk = chunks.pop(0)
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi.app(scope, receive, send)
+    return sent[0]["status"], sent[1]["body"]
+
+
+def upload_data(pdf_files, **form):
+    return {"files[]": [(io.BytesIO(p.read_bytes()), p.name) for p in pdf_files], **form}
+
+
+def test_concurrent_uploads_keep_their_own_output(asgi, pdf_files, fake_backend, monkeypatch):
+    scheduler = EmbeddingScheduler(fake_backend)
+    monkeypatch.setattr(asgi.service, "scheduler", lambda: scheduler)
+    # Small enough that every upload spills to a file
+    monkeypatch.setitem(asgi.config, "UPLOAD_SPILL_BYTES", 1024)
+
+    async def run():
+        return await asyncio.gather(
+            *(call(asgi, "POST", "/upload", upload_data(pdf_files, mode="persona", persona=persona,
+                                                          job_description="Plan a trip"))
+              for persona in ("Chef", "Historian")),
+            *(call(asgi, "POST", "/upload", upload_data(pdf_files[:1], mode="structure")) for _ in range(2)))
+
+    try:
+        responses = asyncio.run(run())
+    finally:
+        scheduler.close()
+
+    outputs = []
+    for status, body in responses:
+        payload = json.loads(body)
+        assert status == 200, payload
+        outputs.extend(r["output_file"] for r in payload["results"])
+    assert len(set(outputs)) == 4
+    for name, persona in zip(outputs[:2], ("Chef", "Historian")):
+        status, body = asyncio.run(call(asgi, "GET", f"/download/{name}"))
+        assert status == 200
+        assert json.loads(body)["metadata"]["persona"] == persona
+    assert all(name.startswith(pdf_files[0].stem + "_structure_") for name in outputs[2:])
+    assert list(Path(asgi.config["UPLOAD_FOLDER"]).iterdir()) == []
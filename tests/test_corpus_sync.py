@@ -0,0 +1,161 @@
+import threading
+
+import numpy as np
+
+from bench.synthetic import generate_pdf
+from src.persona_analyzer import PersonaAnalyzer
+from src.vector_index import METADATA_FILE, SectionIndex, SectionIndexWriter, index_lock
+
+from conftest import FakeBackend
+
+QUERIES = [{"persona": f"Reader {i}", "job_to_be_done": f"Find topic {i}"} for i in range(4)]
+
+
+def ranked(analyzer, index_dir, nprobe=None):
+    index = SectionIndex(index_dir)
+    return [analyzer.query_index(index, config, nprobe=nprobe)["extracted_sections"] for config in QUERIES]
+
+
+def assert_matches_full_build(analyzer, pdf_dir, index_dir, tmp_path):
+    reference_dir = tmp_path / "reference"
+    PersonaAnalyzer(backend=analyzer.backend, top_k=10, score_threshold=-1.0).build_index(
+        sorted(pdf_dir.glob("*.pdf")), reference_dir)
+    index, reference = SectionIndex(index_dir), SectionIndex(reference_dir)
+    assert sorted(index.documents) == sorted(reference.documents)
+    assert sorted(map(str, index.metadata)) == sorted(map(str, reference.metadata))
+    # Row order differs, so sections with equal text tie in another order
+    titles = [[(s["section_title"], s["importance_rank"]) for s in sections]
+              for sections in ranked(analyzer, index_dir)]
+    assert titles == [[(s["section_title"], s["importance_rank"]) for s in sections]
+                      for sections in ranked(analyzer, reference_dir)]
+
+
+def test_sync_tracks_added_changed_and_removed_files(tmp_path, pdf_dir):
+    analyzer = PersonaAnalyzer(backend=FakeBackend(), top_k=10, score_threshold=-1.0)
+    index_dir = tmp_path / "index"
+
+    changes = analyzer.sync_index(sorted(pdf_dir.glob("*.pdf")), index_dir)
+    assert changes.summary() == {"added": 3, "changed": 0, "removed": 0, "unchanged": 0}
+    assert_matches_full_build(analyzer, pdf_dir, index_dir, tmp_path)
+
+    encoded = analyzer.backend.texts_encoded
+    assert not analyzer.sync_index(sorted(pdf_dir.glob("*.pdf")), index_dir)
+    assert analyzer.backend.texts_encoded == encoded
+
+    generate_pdf(pdf_dir / "doc0.pdf", pages=2, headings_per_page=2, seed=10)
+    (pdf_dir / "doc1.pdf").unlink()
+    generate_pdf(pdf_dir / "doc3.pdf", pages=2, headings_per_page=2, seed=11)
+    changes = analyzer.sync_index(sorted(pdf_dir.glob("*.pdf")), index_dir)
+    assert changes.summary() == {"added": 1, "changed": 1, "removed": 1, "unchanged": 1}
+    assert_matches_full_build(analyzer, pdf_dir, index_dir, tmp_path)
+
+
+def test_sync_compacts_once_many_rows_are_deleted(tmp_path, pdf_dir):
+    analyzer = PersonaAnalyzer(backend=FakeBackend())
+    index_dir = tmp_path / "index"
+    analyzer.sync_index(sorted(pdf_dir.glob("*.pdf")), index_dir, ann_lists=4)
+    full = SectionIndex(index_dir).count
+
+    (pdf_dir / "doc0.pdf").unlink()
+    (pdf_dir / "doc1.pdf").unlink()
+    analyzer.sync_index(sorted(pdf_dir.glob("*.pdf")), index_dir, ann_lists=4)
+    index = SectionIndex(index_dir)
+    assert index.live is None and index.count < full
+    assert index.documents == ["doc2.pdf"]
+    assert {m["document"] for m in index.metadata} == {"doc2.pdf"}
+    assert len(index.ann.assignments) == index.count
+    assert ranked(analyzer, index_dir, nprobe=index.ann.nlist) == ranked(analyzer, index_dir)
+
+
+def test_sync_rebuilds_for_another_embedding_model(tmp_path, pdf_dir):
+    index_dir = tmp_path / "index"
+    pdfs = sorted(pdf_dir.glob("*.pdf"))
+    PersonaAnalyzer(backend=FakeBackend(dim=16, cache_id="old")).sync_index(pdfs, index_dir, ann_lists=4)
+
+    analyzer = PersonaAnalyzer(backend=FakeBackend(dim=8, cache_id="new"))
+    changes = analyzer.sync_index(pdfs, index_dir, ann_lists=2)
+    assert changes.summary()["added"] == 3
+    index = SectionIndex(index_dir)
+    assert (index.embedding_id, index.dim) == ("new", 8)
+    assert index.ann is not None and index.ann.centroids.shape == (2, 8)
+    assert ranked(analyzer, index_dir, nprobe=2) == ranked(analyzer, index_dir)
+
+
+def test_sync_extends_the_ivf(tmp_path, pdf_dir):
+    analyzer = PersonaAnalyzer(backend=FakeBackend(), top_k=10, score_threshold=-1.0)
+    index_dir = tmp_path / "index"
+    analyzer.sync_index(sorted(pdf_dir.glob("*.pdf"))[:2], index_dir, ann_lists=4)
+    centroids = SectionIndex(index_dir).ann.centroids
+
+    analyzer.sync_index(sorted(pdf_dir.glob("*.pdf")), index_dir, ann_lists=4)
+    index = SectionIndex(index_dir)
+    assert np.array_equal(index.ann.centroids, centroids)
+    assert len(index.ann.assignments) == index.count
+    assert ranked(analyzer, index_dir, nprobe=index.ann.nlist) == ranked(analyzer, index_dir)
+
+
+def test_append_keeps_the_bytes_readers_may_be_reading(tmp_path):
+    index_dir = tmp_path / "index"
+    sections = [{"document": "a.pdf", "section_title": f"S{i}", "page": 1} for i in range(3)]
+    writer = SectionIndexWriter(index_dir, "fake")
+    writer.add(sections, np.eye(3, dtype=np.float32))
+    writer.close(["a.pdf"])
+    path = SectionIndex(index_dir).index_dir / METADATA_FILE
+    before = path.read_bytes()
+    inode = path.stat().st_ino
+    # Rows an interrupted append left after the last header
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"document": "b.pdf", "section_title": "Half')
+
+    writer = SectionIndexWriter(index_dir, "fake", append=True)
+    assert path.read_bytes() == before and path.stat().st_ino == inode
+    writer.add([{"document": "b.pdf", "section_title": "T", "page": 2}], np.ones((1, 3), dtype=np.float32))
+    writer.close(["b.pdf"])
+    assert path.read_bytes().startswith(before)
+    assert [m["section_title"] for m in SectionIndex(index_dir).metadata] == ["S0", "S1", "S2", "T"]
+
+
+def test_readers_see_a_complete_index_during_syncs(tmp_path, pdf_dir):
+    analyzer = PersonaAnalyzer(backend=FakeBackend())
+    index_dir = tmp_path / "index"
+    pdfs = sorted(pdf_dir.glob("*.pdf"))
+    analyzer.sync_index(pdfs, index_dir, ann_lists=2)
+    query = FakeBackend().encode("query")
+    errors = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                index = SectionIndex(index_dir)
+                assert len(index.metadata) == index.count
+                for nprobe in (None, 2):
+                    for row, _ in index.search(query, 5, -1.0, nprobe=nprobe):
+                        assert index.metadata[row]["document"] in index.documents
+            except Exception as e:
+                errors.append(e)
+                return
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        for i in range(12):
+            analyzer.sync_index(pdfs[:1 + i % 3], index_dir, ann_lists=2)
+    finally:
+        done.set()
+        reader.join()
+    assert errors == []
+
+
+def test_sync_waits_for_the_index_lock(tmp_path, pdf_dir):
+    analyzer = PersonaAnalyzer(backend=FakeBackend())
+    index_dir = tmp_path / "index"
+    synced = threading.Event()
+    worker = threading.Thread(target=lambda: (analyzer.sync_index(sorted(pdf_dir.glob("*.pdf")), index_dir),
+                                              synced.set()))
+    with index_lock(index_dir):
+        worker.start()
+        assert not synced.wait(0.3)
+    worker.join()
+    assert synced.is_set()
+    assert len(SectionIndex(index_dir).documents) == 3
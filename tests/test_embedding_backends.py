@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from src import embedding_backends, model_registry
+from src.embedding_backends import (
+    EmbeddingBackend, check_parity, cosine_similarities, cosine_similarity_matrix, create_backend
+)
+
+from conftest import FakeBackend
+
+
+class FakeModel:
+    """Stands in for a SentenceTransformer"""
+
+    def __init__(self, name, quantize):
+        self.name = name
+        self.quantize = quantize
+
+    def encode(self, texts, batch_size=32):
+        return np.array([[len(t), float(self.quantize)] for t in texts], dtype=np.float64)
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    monkeypatch.setattr(embedding_backends, "_backends", {})
+    monkeypatch.setattr(model_registry, "get_model",
+                        lambda name=model_registry.DEFAULT_MODEL_NAME, quantize=False: FakeModel(name, quantize))
+
+
+def test_torch_backends_are_selected_and_shared(fake_models):
+    fp32 = create_backend({"backend": "torch"})
+    int8 = create_backend({"backend": "torch-int8"})
+    assert (fp32.name, int8.name) == ("torch", "torch-int8")
+    assert create_backend() is fp32
+    assert create_backend({"backend": "torch"}) is fp32
+    # The vectors differ, so the cache keys must too
+    assert fp32.cache_id == model_registry.DEFAULT_MODEL_NAME
+    assert int8.cache_id == f"{model_registry.DEFAULT_MODEL_NAME}:int8"
+    assert int8.model.quantize
+
+
+def test_encode_shapes_and_dtype(fake_models):
+    backend = create_backend()
+    assert backend.encode("abc").shape == (2,)
+    vectors = backend.encode(["a", "bb"])
+    assert vectors.shape == (2, 2) and vectors.dtype == np.float32
+    assert backend.encode([]).shape == (0, 0)
+
+
+def test_invalid_backend_configs(fake_models):
+    with pytest.raises(ValueError):
+        create_backend({"backend": "tensorflow"})
+    with pytest.raises(ValueError):
+        create_backend({"backend": "onnx"})
+
+
+def test_incomplete_backends_cannot_be_created():
+    class NoCacheId(EmbeddingBackend):
+        def _encode_batch(self, texts, batch_size):
+            return np.zeros((len(texts), 2), dtype=np.float32)
+
+    class NoEncode(EmbeddingBackend):
+        cache_id = "no-encode"
+
+    for backend in (EmbeddingBackend, NoCacheId, NoEncode):
+        with pytest.raises(TypeError, match="abstract"):
+            backend()
+
+
+def test_onnx_backend_requires_exported_model(tmp_path, fake_models):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("transformers")
+    with pytest.raises(FileNotFoundError):
+        create_backend({"backend": "onnx", "model_path": str(tmp_path)})
+
+
+def test_cosine_matrix_matches_single_query():
+    rng = np.random.default_rng(0)
+    queries, matrix = rng.normal(size=(3, 8)), rng.normal(size=(20, 8))
+    scores = cosine_similarity_matrix(queries, matrix)
+    for row, query in zip(scores, queries):
+        assert np.allclose(row, cosine_similarities(query, matrix))
+
+
+class NoisyBackend(FakeBackend):
+    """The fake vectors plus a perturbation, like a quantized copy of a model"""
+
+    def __init__(self, scale):
+        super().__init__(cache_id="fake")
+        self.scale = scale
+
+    def _encode_batch(self, texts, batch_size):
+        clean = super()._encode_batch(texts, batch_size)
+        noise = np.random.default_rng(1).normal(size=clean.shape).astype(np.float32)
+        return clean + self.scale * noise
+
+
+def test_parity_report():
+    texts = [f"section {i}" for i in range(30)]
+    same = check_parity(FakeBackend(), NoisyBackend(0.0), "query", texts)
+    assert same["within_tolerance"] and same["same_top_k_order"] and same["max_score_diff"] < 1e-6
+
+    drifted = check_parity(FakeBackend(), NoisyBackend(2.0), "query", texts)
+    assert not drifted["within_tolerance"]
+    assert drifted["max_score_diff"] > 0.02
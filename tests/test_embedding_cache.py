@@ -0,0 +1,59 @@
+import numpy as np
+
+from src.embedding_cache import EmbeddingCache
+from src.persona_analyzer import PersonaAnalyzer
+
+CONFIG = {"persona": "Travel planner", "job_to_be_done": "Plan a trip"}
+
+
+def test_round_trip(tmp_path):
+    cache = EmbeddingCache(tmp_path / "embeddings.db")
+    vectors = np.arange(6, dtype=np.float32).reshape(2, 3)
+    cache.put_many(["a", "b"], vectors, "model")
+    found = cache.get_many(["b", "missing", "a"], "model")
+    assert sorted(found) == [0, 2]
+    assert np.array_equal(found[0], vectors[1])
+    assert cache.get_many(["a"], "other-model") == {}
+
+
+def cache_with_clock(tmp_path, monkeypatch, max_entries):
+    """A cache whose access times advance by one second per call, so LRU order is exact"""
+    clock = iter(range(1_000_000))
+    monkeypatch.setattr("src.embedding_cache.time.time", lambda: float(next(clock)))
+    return EmbeddingCache(tmp_path / "embeddings.db", max_entries=max_entries)
+
+
+def cached_texts(cache, texts):
+    return {texts[i] for i in cache.get_many(texts, "model")}
+
+
+def test_eviction_keeps_most_recent(tmp_path, monkeypatch):
+    cache = cache_with_clock(tmp_path, monkeypatch, max_entries=2)
+    for text in ("a", "b", "c"):
+        cache.put_many([text], [np.ones(2, dtype=np.float32)], "model")
+    assert len(cache) == 2
+    assert cached_texts(cache, ["a", "b", "c"]) == {"b", "c"}
+
+
+def test_eviction_is_least_recently_used(tmp_path, monkeypatch):
+    cache = cache_with_clock(tmp_path, monkeypatch, max_entries=2)
+    for text in ("a", "b"):
+        cache.put_many([text], [np.ones(2, dtype=np.float32)], "model")
+    # Reading "a" makes "b" the least recently used entry
+    assert cached_texts(cache, ["a"]) == {"a"}
+    cache.put_many(["c"], [np.ones(2, dtype=np.float32)], "model")
+    assert cached_texts(cache, ["a", "b", "c"]) == {"a", "c"}
+
+
+def test_second_run_is_served_from_cache(tmp_path, pdf_files, fake_backend):
+    cache = EmbeddingCache(tmp_path / "embeddings.db")
+    assert len(cache) == 0
+
+    first = PersonaAnalyzer(embedding_cache=cache, backend=fake_backend).analyze_documents(pdf_files, CONFIG)
+    assert len(cache) > 0
+    encoded = fake_backend.texts_encoded
+
+    second = PersonaAnalyzer(embedding_cache=cache, backend=fake_backend).analyze_documents(pdf_files, CONFIG)
+    # Only the query is embedded again
+    assert fake_backend.texts_encoded == encoded + 1
+    assert first["extracted_sections"] == second["extracted_sections"]
@@ -0,0 +1,143 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from src import instrumentation
+from src.embedding_scheduler import EmbeddingScheduler
+
+from conftest import FakeBackend
+
+
+class FailingBackend(FakeBackend):
+    """Fails every batch containing the text "boom" """
+
+    def _encode_batch(self, texts, batch_size):
+        if "boom" in texts:
+            self.calls.append(list(texts))
+            raise RuntimeError("cannot encode boom")
+        return super()._encode_batch(texts, batch_size)
+
+
+@pytest.fixture
+def metrics():
+    was_enabled = instrumentation.is_enabled()
+    instrumentation.enable()
+    instrumentation.reset()
+    yield
+    instrumentation.reset()
+    instrumentation.enable(was_enabled)
+
+
+def test_vectors_come_back_in_input_order(fake_backend):
+    scheduler = EmbeddingScheduler(fake_backend, max_wait=0.001)
+    # Texts of different lengths land in different buckets and batches
+    texts = ["a" * n for n in (3, 300, 40, 1000, 7, 90)]
+    try:
+        vectors = scheduler.encode(texts)
+    finally:
+        scheduler.close()
+    assert np.array_equal(vectors, np.stack([fake_backend.vector(t) for t in texts]))
+
+
+def test_concurrent_requests_share_batches(fake_backend):
+    scheduler = EmbeddingScheduler(fake_backend, max_batch_size=64, max_wait=0.05)
+    start = threading.Barrier(8)
+
+    def request(i):
+        start.wait()
+        return scheduler.encode([f"request {i} text {j}" for j in range(4)])
+
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(request, range(8)))
+    finally:
+        scheduler.close()
+    for i, vectors in enumerate(results):
+        assert np.array_equal(vectors, np.stack([fake_backend.vector(f"request {i} text {j}") for j in range(4)]))
+    assert fake_backend.texts_encoded == 32
+    assert len(fake_backend.calls) < 8
+
+
+def test_a_failing_text_only_fails_its_own_request():
+    backend = FailingBackend()
+    scheduler = EmbeddingScheduler(backend, max_wait=0.05)
+    try:
+        good = scheduler.submit(["fine", "also fine"])
+        bad = scheduler.submit(["boom", "fine too"])
+        other = scheduler.submit(["more"])
+        with pytest.raises(RuntimeError, match="boom"):
+            bad.result(timeout=5)
+        assert np.array_equal(good.result(timeout=5), np.stack([backend.vector("fine"), backend.vector("also fine")]))
+        assert np.array_equal(other.result(timeout=5), backend.vector("more")[None])
+    finally:
+        scheduler.close()
+
+
+def test_close_finishes_queued_work(fake_backend):
+    scheduler = EmbeddingScheduler(fake_backend, max_wait=10.0)
+    future = scheduler.submit(["waiting for the deadline"])
+    scheduler.close()
+    assert future.done()
+    assert np.array_equal(future.result(), fake_backend.vector("waiting for the deadline")[None])
+
+
+def test_histograms_record_only_while_enabled(fake_backend, metrics):
+    scheduler = EmbeddingScheduler(fake_backend, max_wait=0.001)
+    try:
+        scheduler.encode(["one", "two"])
+        assert instrumentation.histograms()["pdf_intel_embedding_batch_size"]["count"] == 1
+        instrumentation.enable(False)
+        scheduler.encode(["three"])
+        assert instrumentation.histograms()["pdf_intel_embedding_batch_size"]["count"] == 1
+    finally:
+        scheduler.close()
+
+
+class ShortBackend(FakeBackend):
+    """Drops the last vector of every batch with more than one text"""
+
+    def _encode_batch(self, texts, batch_size):
+        vectors = super()._encode_batch(texts, batch_size)
+        return vectors[:-1] if len(texts) > 1 else vectors
+
+
+class FlatBackend(FakeBackend):
+    """Returns one number per text instead of a vector"""
+
+    def _encode_batch(self, texts, batch_size):
+        return super()._encode_batch(texts, batch_size)[:, 0]
+
+
+def test_a_wrong_number_of_vectors_fails_the_request():
+    backend = ShortBackend()
+    scheduler = EmbeddingScheduler(backend, max_wait=0.05)
+    try:
+        pair = scheduler.submit(["first", "second"])
+        single = scheduler.submit(["alone"])
+        with pytest.raises(ValueError, match="returned 1 vectors for 2 texts"):
+            pair.result(timeout=5)
+        assert np.array_equal(single.result(timeout=5), backend.vector("alone")[None])
+    finally:
+        scheduler.close()
+
+
+def test_unexpected_errors_fail_the_waiting_requests(fake_backend):
+    scheduler = EmbeddingScheduler(FlatBackend(), max_wait=0.001)
+    try:
+        with pytest.raises(IndexError):
+            scheduler.submit(["malformed output"]).result(timeout=5)
+        # The inference thread is still serving
+        scheduler.backend = fake_backend
+        assert np.array_equal(scheduler.encode(["fine"]), fake_backend.vector("fine")[None])
+    finally:
+        scheduler.close()
+
+
+def test_submit_after_close_raises(fake_backend):
+    scheduler = EmbeddingScheduler(fake_backend)
+    scheduler.close()
+    scheduler.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        scheduler.submit(["too late"])
@@ -0,0 +1,59 @@
+import pytest
+
+import main
+
+
+def test_jsonl_errors_name_the_line(tmp_path):
+    path = tmp_path / "personas.jsonl"
+    path.write_text('{"persona": "Chef"}\n\n{"persona": "Historian",}\n', encoding="utf-8")
+    with pytest.raises(ValueError, match=r"personas.jsonl, line 3: "):
+        main.load_persona_configs(path)
+
+
+def test_jsonl_configs_load_in_order(tmp_path):
+    path = tmp_path / "personas.jsonl"
+    path.write_text('{"id": "a"}\n\n{"id": "b"}\n', encoding="utf-8")
+    assert main.load_persona_configs(path) == [{"id": "a"}, {"id": "b"}]
+
+
+def test_output_names_follow_ids_and_positions():
+    configs = [{"id": "chef/1"}, {"persona": "Travel Planner"}, {}]
+    assert main.persona_output_names(configs) == [
+        "persona_analysis_chef_1.json", "persona_analysis_002_Travel_Planner.json", "persona_analysis_003_persona.json"]
+
+
+@pytest.mark.parametrize("ids", [("chef", "chef"), ("chef/1", "chef 1")])
+def test_clashing_output_names_are_rejected(ids):
+    with pytest.raises(ValueError, match="persona_analysis_chef"):
+        main.persona_output_names([{"id": i, "persona": "Chef"} for i in ids])
+
+
+def test_clashing_ids_fail_before_any_analysis(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(main, "create_analyzer", lambda *args: pytest.fail("analysis started"))
+    configs = [{"id": "x"}, {"id": "x"}]
+    main.run_personas(None, configs, [], tmp_path, tmp_path)
+    assert "overwrite each other's output" in capsys.readouterr().out
+    assert not list(tmp_path.glob("*.json"))
+
+
+def test_structure_runs_are_served_from_the_document_cache(tmp_path, pdf_files, monkeypatch):
+    from src.document_parser import DocumentParser
+
+    (tmp_path / "input").mkdir()
+    for pdf in pdf_files:
+        (tmp_path / "input" / pdf.name).write_bytes(pdf.read_bytes())
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("sys.argv", ["main.py", "--no-timings", "structure"])
+    parsed = []
+    parse = DocumentParser.parse
+    monkeypatch.setattr(DocumentParser, "parse", lambda self, pdf: parsed.append(pdf.name) or parse(self, pdf))
+
+    main.main()
+    first = {p.name: p.read_text() for p in (tmp_path / "output").glob("*_structure.json")}
+    assert sorted(parsed) == sorted(p.name for p in pdf_files)
+    assert len(first) == len(pdf_files)
+
+    parsed.clear()
+    main.main()
+    assert parsed == []
+    assert {p.name: p.read_text() for p in (tmp_path / "output").glob("*_structure.json")} == first
@@ -0,0 +1,64 @@
+from bench.synthetic import generate_pdf
+from src import document_snapshot
+from src.document_parser import DocumentParser
+from src.pdf_processor import PDFProcessor
+from src.section_segmenter import segment_sections
+
+
+def test_sections_carry_the_text_below_their_heading(pdf_files):
+    structure, sections = DocumentParser().parse(pdf_files[0])
+    outline = {(h["text"], h["page"]) for h in structure["outline"]}
+    assert outline <= {(s["section_title"], s["page"]) for s in sections}
+    assert all(s["combined"].startswith(s["section_title"]) for s in sections)
+    assert any(len(s["combined"]) > len(s["section_title"]) for s in sections)
+
+
+def test_headings_are_classified_once_per_page(pdf_files, monkeypatch):
+    calls = []
+    classify = document_snapshot.classify_headings
+    monkeypatch.setattr(document_snapshot, "classify_headings",
+                        lambda spans: calls.append(spans) or classify(spans))
+    processor = PDFProcessor()
+    assert processor.load_pdf(pdf_files[0])
+    pages = processor.page_count
+    assert DocumentParser().parse(pdf_files[0]) is not None
+    assert len(calls) == pages
+
+
+def test_sharded_load_matches_a_serial_one(tmp_path):
+    pdf = tmp_path / "long.pdf"
+    generate_pdf(pdf, pages=7, headings_per_page=3, seed=5)
+    serial, sharded = PDFProcessor(), PDFProcessor()
+    assert serial.load_pdf(pdf)
+    try:
+        assert sharded.load_pdf(pdf, page_workers=2, shard_size=3)
+    finally:
+        sharded.shutdown()
+    # The shards classified their pages' headings in the worker processes
+    assert sorted(sharded.snapshot._headings) == list(range(7))
+    assert sharded.extract_sections_by_formatting() == serial.extract_sections_by_formatting()
+    assert segment_sections(sharded.snapshot) == segment_sections(serial.snapshot)
+
+
+def test_sharded_loads_share_one_pool(tmp_path):
+    pdfs = [tmp_path / "first.pdf", tmp_path / "second.pdf"]
+    for seed, pdf in enumerate(pdfs):
+        generate_pdf(pdf, pages=7, headings_per_page=2, seed=seed)
+    processor = PDFProcessor()
+    try:
+        assert processor.load_pdf(pdfs[0], page_workers=2, shard_size=3)
+        pool = processor._shard_pool
+        # Only the shards hold the file open
+        assert pool is not None and processor.doc is None
+        first = segment_sections(processor.snapshot)
+        processor.close()
+        assert processor.load_pdf(pdfs[1], page_workers=2, shard_size=3)
+        assert processor._shard_pool is pool
+        second = segment_sections(processor.snapshot)
+    finally:
+        processor.shutdown()
+    assert processor._shard_pool is None
+    for pdf, sections in zip(pdfs, (first, second)):
+        serial = PDFProcessor()
+        assert serial.load_pdf(pdf)
+        assert sections == segment_sections(serial.snapshot)
@@ -0,0 +1,92 @@
+import numpy as np
+
+from src.persona_analyzer import PersonaAnalyzer
+from src.vector_index import SectionIndex, SectionIndexWriter, top_k_above
+
+from conftest import FakeBackend
+
+
+def test_top_k_above_breaks_ties_by_row():
+    scores = np.array([0.5, 0.9, 0.5, 0.1, 0.5, 0.9])
+    assert top_k_above(scores, 3, 0.2) == [(1, 0.9), (5, 0.9), (0, 0.5)]
+    assert top_k_above(scores, 5, 0.95) == []
+    assert top_k_above(scores, 0, 0.0) == []
+
+
+def test_writer_round_trip(tmp_path):
+    writer = SectionIndexWriter(tmp_path, "model")
+    sections = [{"document": "a.pdf", "section_title": f"S{i}", "page": i} for i in range(3)]
+    writer.add(sections, np.eye(3, 4, dtype=np.float32) * 5)
+    writer.close(["a.pdf"])
+    index = SectionIndex(tmp_path)
+    assert (index.count, index.dim, index.documents) == (3, 4, ["a.pdf"])
+    assert [m["section_title"] for m in index.metadata] == ["S0", "S1", "S2"]
+    assert np.allclose(np.linalg.norm(index.vectors, axis=1), 1.0)
+    assert index.search(np.array([0, 1, 0, 0]), 1, 0.5) == [(1, 1.0)]
+
+
+def test_rebuild_drops_ivf_of_previous_rows(tmp_path, pdf_files):
+    index_dir = tmp_path / "index"
+    PersonaAnalyzer(backend=FakeBackend(cache_id="a")).build_index(pdf_files, index_dir, ann_lists=4)
+    assert SectionIndex(index_dir).ann is not None
+
+    # Same corpus, so the same row count, but different vectors
+    rebuilt = PersonaAnalyzer(backend=FakeBackend(cache_id="b"))
+    rebuilt.build_index(pdf_files, index_dir)
+    index = SectionIndex(index_dir)
+    assert index.embedding_id == "b" and index.ann is None
+
+    rebuilt.build_index(pdf_files, index_dir, ann_lists=4)
+    index = SectionIndex(index_dir)
+    query = rebuilt.backend.encode("query")
+    assert index.search(query, 5, -1.0, nprobe=index.ann.nlist) == index.search(query, 5, -1.0)
+
+
+def write_index(index_dir, rows, embedding_id="model", append=False, document="a.pdf"):
+    writer = SectionIndexWriter(index_dir, embedding_id, append=append)
+    sections = [{"document": document, "section_title": f"{document} {i}", "page": 1} for i in range(rows)]
+    writer.add(sections, np.random.default_rng(rows).normal(size=(rows, 4)))
+    return writer, sections
+
+
+def test_rebuild_is_invisible_until_closed(tmp_path):
+    writer, _ = write_index(tmp_path, 5)
+    writer.close(["a.pdf"])
+    before = SectionIndex(tmp_path)
+
+    writer, _ = write_index(tmp_path, 3, document="b.pdf")
+    during = SectionIndex(tmp_path)
+    assert (during.count, len(during.metadata), during.documents) == (5, 5, ["a.pdf"])
+    writer.close(["b.pdf"])
+
+    after = SectionIndex(tmp_path)
+    assert (after.count, after.documents) == (3, ["b.pdf"])
+    # Readers that opened the previous version keep working
+    assert before.search(before.vectors[0], 1, -1.0)[0][0] == 0
+    assert len(before.metadata) == 5
+
+
+def test_old_versions_are_removed(tmp_path):
+    for rows in (2, 3, 4):
+        write_index(tmp_path, rows)[0].close(["a.pdf"])
+    versions = [p for p in tmp_path.iterdir() if p.name.startswith("version-")]
+    # The published version plus the one it replaced
+    assert len(versions) == 2
+    assert SectionIndex(tmp_path).count == 4
+
+
+def test_unversioned_index_is_read_and_converted(tmp_path):
+    writer, _ = write_index(tmp_path / "build", 3)
+    writer.close(["a.pdf"])
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    for path in SectionIndex(tmp_path / "build").index_dir.iterdir():
+        path.rename(legacy / path.name)
+    assert SectionIndex(legacy).count == 3
+
+    write_index(legacy, 2, append=True, document="b.pdf")[0].close(["b.pdf"])
+    assert SectionIndex(legacy).documents == ["a.pdf", "b.pdf"]
+
+    write_index(legacy, 4)[0].close(["a.pdf"])
+    assert SectionIndex(legacy).count == 4
+    assert not (legacy / "index.json").exists()